@@ -0,0 +1,161 @@
+"""
+Benchmarks for smbio.math.information.
+
+Each benchmark runs on a synthetic (seeded) dataset, for every combination of
+sample count, cardinality and number of features in the sweep.  For each run,
+the best time over a few repeats is reported as throughput (pairs of features
+per second), along with the peak memory allocated during one run (as seen by
+tracemalloc, which NumPy reports its allocations to).  The per-call functions
+are benchmarked alongside the batched ones, so they can be compared directly.
+
+Run from the repository root:
+
+    python benchmarks/information.py [--quick] [--json results.jsonl]
+"""
+
+import argparse
+import itertools as it
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+# Run as a script, only this directory is on sys.path, not the repository.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from smbio.math import information as info
+
+
+def pair_loop(X, c):
+    """Call mutual_info() on every pair of columns."""
+    for i, j in it.combinations(range(X.shape[1]), 2):
+        info.mutual_info(X[:, i], X[:, j])
+
+
+def pair_loop_fast(X, c):
+    """Call mutual_info_fast() on every pair, with precomputed entropies."""
+    h = [info.entropy(X[:, i]) for i in range(X.shape[1])]
+    for i, j in it.combinations(range(X.shape[1]), 2):
+        info.mutual_info_fast(X[:, i], X[:, j], h[i], h[j])
+
+
+def synergy_loop(X, c):
+    """Call synergy() on every pair of columns."""
+    for i, j in it.combinations(range(X.shape[1]), 2):
+        info.synergy(X[:, i], X[:, j], c)
+
+
+def entropy_loop(X, c):
+    """Call entropy() on every column (counted as one pair per column)."""
+    for i in range(X.shape[1]):
+        info.entropy(X[:, i])
+
+
+def joint_loop(X, c):
+    """Call joint_dataset() on every pair of columns."""
+    for i, j in it.combinations(range(X.shape[1]), 2):
+        info.joint_dataset(X[:, i], X[:, j])
+
+
+# name -> (function, whether it is counted per column rather than per pair)
+BENCHMARKS = {
+    'entropy': (entropy_loop, True),
+    'joint_dataset': (joint_loop, False),
+    'mutual_info': (pair_loop, False),
+    'mutual_info_fast': (pair_loop_fast, False),
+    'mutual_info_matrix': (lambda X, c: info.mutual_info_matrix(X), False),
+    'synergy': (synergy_loop, False),
+    'synergy_matrix': (lambda X, c: info.synergy_matrix(X, c), False),
+}
+
+SWEEP = {
+    'samples': [100, 1000, 10000],
+    'cardinality': [2, 3, 8],
+    'features': [50, 200],
+}
+
+QUICK_SWEEP = {
+    'samples': [1000],
+    'cardinality': [2, 3],
+    'features': [50],
+}
+
+
+def dataset(samples, cardinality, features, seed=0):
+    """
+    Create a random feature matrix and a binary phenotype.
+
+    :param int samples: Number of rows.
+    :param int cardinality: Number of values each feature takes.
+    :param int features: Number of columns.
+    :param int seed: Random seed.
+    :return: Tuple of (feature matrix, phenotype).
+    """
+    rng = np.random.default_rng(seed)
+    X = rng.integers(0, cardinality, size=(samples, features))
+    return X, rng.integers(0, 2, size=samples)
+
+
+def measure(func, X, c, repeat):
+    """
+    Time a benchmark function and measure its peak memory.
+
+    :param func: Benchmark function, taking (X, c).
+    :param X: Feature matrix.
+    :param c: Phenotype.
+    :param int repeat: Number of timed runs (the best is reported).
+    :return: Tuple of (best time in seconds, peak memory in bytes).
+    """
+    tracemalloc.start()
+    func(X, c)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(X, c)
+        best = min(best, time.perf_counter() - start)
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--quick', action='store_true',
+                        help='run a small sweep')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='timed runs per benchmark (default 3)')
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS),
+                        help='benchmarks to run (default all)')
+    parser.add_argument('--json', help='append results as JSON lines here')
+    args = parser.parse_args()
+
+    sweep = QUICK_SWEEP if args.quick else SWEEP
+    names = args.only or list(BENCHMARKS)
+    out = open(args.json, 'a') if args.json else None
+    print('%-20s %8s %5s %6s %10s %14s %10s' % (
+        'benchmark', 'samples', 'card', 'feats', 'seconds', 'pairs/sec',
+        'peak MiB'))
+    for samples, cardinality, features in it.product(*sweep.values()):
+        X, c = dataset(samples, cardinality, features)
+        for name in names:
+            func, per_column = BENCHMARKS[name]
+            pairs = features if per_column else features * (features - 1) // 2
+            seconds, peak = measure(func, X, c, args.repeat)
+            print('%-20s %8d %5d %6d %10.4f %14.0f %10.2f' % (
+                name, samples, cardinality, features, seconds,
+                pairs / seconds, peak / 2 ** 20))
+            if out:
+                out.write(json.dumps({
+                    'benchmark': name, 'samples': samples,
+                    'cardinality': cardinality, 'features': features,
+                    'seconds': seconds, 'pairs_per_second': pairs / seconds,
+                    'peak_bytes': peak}) + '\n')
+    if out:
+        out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,704 @@
 """Contains the Experiment class."""
 
+import asyncio
+import concurrent.futures
+import datetime
+import hashlib
+import importlib.util
+import inspect
 import itertools as it
+import json
 import multiprocessing as mp
+import multiprocessing.util
+import os
+import pickle
+import random
+import shutil
+import signal
+import socket
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
 import traceback
+import warnings
+import weakref
 from abc import ABCMeta, abstractmethod
-from collections import OrderedDict
+from collections import OrderedDict, deque
+from contextlib import contextmanager, nullcontext
+from multiprocessing.connection import Client, Listener
+
+try:
+    import resource
+except ImportError:  # Not available on Windows.
+    resource = None
+
+
+def _peak_rss():
+    """
+    Return the peak resident set size of this process, in bytes.
+
+    :return: Peak RSS, or None where the :mod:`resource` module is missing.
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def _connect(path):
+    """
+    Open a SQLite database for a journal or cache.
+
+    Write-ahead logging with ``synchronous=NORMAL`` makes a commit per result
+    cheap, while still surviving the process dying.
+
+    :param str path: Path of the database file (created if missing).
+    :return: A :class:`sqlite3.Connection`, usable from any thread.
+    """
+    db = sqlite3.connect(path, check_same_thread=False)
+    db.execute('PRAGMA journal_mode=WAL')
+    db.execute('PRAGMA synchronous=NORMAL')
+    return db
+
+
+class Journal(object):
+    """
+    An on-disk record of which configurations of an experiment are complete.
+
+    The journal is a SQLite database with one row per completed
+    configuration, optionally holding the pickled return value of
+    :func:`Experiment.task`.  Each row is committed as soon as its result
+    arrives, so if a run dies, everything that finished is still recorded.
+    Passing the same journal to :func:`Experiment.run` again skips the
+    recorded configurations, and replays their stored results into
+    :func:`Experiment.result`, so resuming only costs the remaining work.
+
+    Configurations are keyed by their ``repr()``, so parameter values need
+    reprs that are the same from one run to the next (numbers, strings and
+    tuples of them are fine).
+    """
+
+    def __init__(self, path, store_results=True):
+        """
+        **Constructor**
+
+        :param str path: Path of the database file (created if missing).
+        :param bool store_results: Whether to store each task's return value
+          (so that it can be replayed), or only the fact that it finished.
+        :return: None
+        """
+        self.path = path
+        self.store_results = store_results
+        self._db = _connect(path)
+        self._db.execute('CREATE TABLE IF NOT EXISTS completed '
+                         '(configuration TEXT PRIMARY KEY, result BLOB)')
+        self._db.commit()
+
+    @staticmethod
+    def key(configuration):
+        """Return the key a configuration is stored under."""
+        return repr(tuple(configuration))
+
+    def __contains__(self, configuration):
+        """Return True if the configuration has been recorded."""
+        return self._db.execute(
+            'SELECT 1 FROM completed WHERE configuration = ?',
+            (self.key(configuration),)).fetchone() is not None
+
+    def __len__(self):
+        """Return the number of recorded configurations."""
+        return self._db.execute('SELECT COUNT(*) FROM completed').fetchone()[0]
+
+    def get(self, configuration):
+        """
+        Look up the stored result of a configuration.
+
+        :param tuple configuration: The configuration.
+        :return: A ``(stored, retval)`` pair.  ``stored`` is False if the
+          configuration isn't recorded, or was recorded without its result.
+        """
+        row = self._db.execute(
+            'SELECT result FROM completed WHERE configuration = ?',
+            (self.key(configuration),)).fetchone()
+        if row is None or row[0] is None:
+            return False, None
+        return True, pickle.loads(row[0])
+
+    def record(self, configuration, retval):
+        """
+        Record that a configuration completed, and commit.
+
+        :param tuple configuration: The configuration.
+        :param retval: The value returned by :func:`Experiment.task`.
+        :return: None
+        """
+        blob = pickle.dumps(retval) if self.store_results else None
+        self._db.execute('INSERT OR REPLACE INTO completed VALUES (?, ?)',
+                         (self.key(configuration), blob))
+        self._db.commit()
+
+    def close(self):
+        """Close the database."""
+        self._db.close()
+
+
+def _dump_shared(value, directory):
+    """
+    Write an array or DataFrame to ``.npy`` files, for :func:`_load_shared`.
+
+    DataFrame columns are written one file each.  Columns of ``object`` dtype
+    can't be memory-mapped, so they are kept in the descriptor instead.
+
+    :param value: A NumPy array or pandas DataFrame.
+    :param str directory: Directory to write the files to.
+    :return: A small, picklable descriptor of the files.
+    """
+    import numpy as np
+    if isinstance(value, np.ndarray):
+        path = os.path.join(directory, 'array.npy')
+        np.save(path, value)
+        return ('array', path)
+
+    columns = []
+    for index, column in enumerate(value.columns):
+        values = value[column].to_numpy()
+        if values.dtype.hasobject:
+            columns.append((column, None, values))
+        else:
+            path = os.path.join(directory, '%d.npy' % index)
+            np.save(path, values)
+            columns.append((column, path, None))
+    return ('frame', value.index, columns)
+
+
+def _load_shared(descriptor):
+    """
+    Map the files written by :func:`_dump_shared`, read-only.
+
+    :param tuple descriptor: Value returned by :func:`_dump_shared`.
+    :return: A read-only, memory-mapped array or DataFrame.
+    """
+    import numpy as np
+    if descriptor[0] == 'array':
+        return np.load(descriptor[1], mmap_mode='r')
+
+    import pandas as pd
+    _, index, columns = descriptor
+    return pd.DataFrame(OrderedDict(
+        (column, values if path is None else np.load(path, mmap_mode='r'))
+        for column, path, values in columns), index=index, copy=False)
+
+
+def _alarm(timeout):
+    """
+    Return a SIGALRM handler that raises a :class:`TimeoutError`.
+
+    :param float timeout: The timeout, for the error message.
+    :return: A signal handler.
+    """
+    def handler(signum, frame):
+        raise TimeoutError('task timed out after %g seconds' % timeout)
+    return handler
+
+
+# The experiment that this worker process runs tasks for (see _init_worker).
+_worker_experiment = None
+
+# Environment variables that cap the thread pools of BLAS and OpenMP.
+_THREAD_VARIABLES = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS',
+                     'MKL_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS',
+                     'NUMEXPR_NUM_THREADS')
+
+# Index of the CPU set this worker is pinned to, if any (see _init_worker).
+_worker_cpu_set = None
+
+# The threadpoolctl limits in force in this worker, if any.
+_thread_limits = None
+
+# This worker's slot in the pool's table of running batches, and the shared
+# array of the batch running in each slot (see _init_worker).
+_worker_slot = None
+_worker_batches = None
+
+# How often (in seconds) the parent checks for workers that died mid-batch.
+_POLL_INTERVAL = 0.25
+
+
+def _limit_threads(threads):
+    """
+    Limit the threads used by BLAS and OpenMP in this process.
+
+    The environment variables only take effect for libraries that haven't
+    been loaded yet.  So, if threadpoolctl is installed, it is used as well,
+    to change the limits of libraries that are already loaded (as NumPy
+    usually is, in a forked worker).
+
+    :param int threads: Maximum number of threads.
+    :return: None
+    """
+    global _thread_limits
+    for name in _THREAD_VARIABLES:
+        os.environ[name] = str(threads)
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return
+    _thread_limits = threadpool_limits(limits=threads)
+
+
+@contextmanager
+def _thread_environment(threads):
+    """
+    Set the BLAS/OpenMP thread limits in this process's environment, for now.
+
+    Worker processes started in the meantime inherit the limits, and load
+    BLAS with them.  The previous values are restored afterwards.
+
+    :param int threads: Maximum number of threads, or None to leave the
+      environment alone.
+    :return: A context manager.
+    """
+    saved = {name: os.environ.get(name) for name in _THREAD_VARIABLES}
+    if threads is not None:
+        for name in _THREAD_VARIABLES:
+            os.environ[name] = str(threads)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def _cpu_sets(cpus, processes):
+    """
+    Return the CPU sets to pin pool workers to.
+
+    :param cpus: True to split the CPUs this process may run on into
+      ``processes`` contiguous sets, or a list of CPU sets to use as is.
+    :param int processes: Number of workers.
+    :return: List of sets of CPU numbers.
+    :raises ValueError: If CPU affinity isn't supported on this platform, or
+      a set is empty or holds CPUs this process may not run on.  (Checking
+      here, in the parent, matters: a pool whose initializer fails keeps
+      starting new workers forever.)
+    """
+    if not hasattr(os, 'sched_setaffinity'):
+        raise ValueError('Experiment.run: cpu_affinity is not supported on '
+                         'this platform')
+    available = sorted(os.sched_getaffinity(0))
+    if cpus is not True:
+        cpu_sets = [set(cpu_set) for cpu_set in cpus]
+        for cpu_set in cpu_sets:
+            if not cpu_set or not cpu_set <= set(available):
+                raise ValueError('Experiment.run: bad CPU set %r for '
+                                 'cpu_affinity (available: %r)'
+                                 % (sorted(cpu_set), available))
+        return cpu_sets
+    processes = min(processes, len(available))
+    return [set(available[i * len(available) // processes:
+                          (i + 1) * len(available) // processes])
+            for i in range(processes)]
+
+
+def _release_cpu_set(occupancy, index):
+    """
+    Give back a CPU set claimed by :func:`_init_worker`, as a worker exits.
+
+    :param occupancy: Shared array of the number of workers on each set.
+    :param int index: The set to give back.
+    :return: None
+    """
+    with occupancy.get_lock():
+        occupancy[index] -= 1
+
+
+def _alive(pid):
+    """
+    Return whether a process exists (or hasn't been reaped yet).
+
+    :param int pid: The process ID.
+    :return: Boolean.
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _release_slot(pids, index):
+    """
+    Give back a slot claimed by :func:`_init_worker`, as a worker exits.
+
+    :param pids: Shared array of the process ID holding each slot.
+    :param int index: The slot to give back.
+    :return: None
+    """
+    with pids.get_lock():
+        pids[index] = 0
+
+
+def _load_worker_payload(cls, state):
+    """
+    Unpickle a :class:`_WorkerPayload`.
+
+    :param type cls: The experiment's class.
+    :param dict state: Value of :func:`Experiment._worker_state`.
+    :return: A :class:`_WorkerPayload`.
+    """
+    experiment = cls.__new__(cls)
+    experiment.__setstate__(state)
+    return _WorkerPayload(experiment)
+
+
+class _WorkerPayload(object):
+    """
+    Wraps an experiment to send to workers, pickling only what they need.
+
+    The experiment is pickled with :func:`Experiment._worker_state` instead of
+    its usual state, so that it can be sent to workers even if its parameter
+    space holds lambdas.
+    """
+
+    def __init__(self, experiment):
+        """
+        **Constructor**
+
+        :param Experiment experiment: The experiment.
+        :return: None
+        """
+        self.experiment = experiment
+
+    def __reduce__(self):
+        """Pickle the experiment's worker state."""
+        return (_load_worker_payload, (type(self.experiment),
+                                       self.experiment._worker_state()))
+
+
+def _init_worker(payload, threads=None, cpu_sets=None, occupancy=None,
+                 running=None):
+    """
+    Pool initializer: keep the experiment for the life of this worker.
+
+    This is how the experiment gets to each worker exactly once, at pool
+    startup, instead of along with every task.  It comes pickled, once,
+    before the pool starts, so that a replacement worker gets the same
+    bytes, rather than a new pickle of everything :func:`Experiment.result`
+    has accumulated since.  The worker's BLAS threads are limited, and it is
+    pinned to a CPU set, if :func:`Experiment.run` asked for that.
+
+    Each worker takes the CPU set with the fewest live workers, and gives it
+    back when it exits.  So when the pool replaces a worker (because of
+    ``maxtasksperchild``), the replacement takes over the set that was
+    freed, rather than doubling up on another one.
+
+    Each worker also claims a free slot in ``running``, where it notes the
+    batch it is running (see :func:`_run_batch`).  A worker that exits
+    normally frees its slot; one that dies (say, of a segfault or the OOM
+    killer) leaves its PID there, which is how the parent finds its batch.
+
+    :param bytes payload: The experiment, as a pickled
+      :class:`_WorkerPayload`.
+    :param int threads: Maximum number of BLAS/OpenMP threads.
+    :param list cpu_sets: CPU sets to pin workers to.
+    :param occupancy: Shared array of the number of live workers pinned to
+      each CPU set.
+    :param tuple running: Shared arrays of the PID holding each slot, and
+      the ID of the batch it is running.
+    :return: None
+    """
+    global _worker_experiment, _worker_cpu_set, _worker_slot, _worker_batches
+    _worker_experiment = pickle.loads(payload).experiment
+    if running is not None:
+        pids, _worker_batches = running
+        with pids.get_lock():
+            free = [i for i in range(len(pids)) if not pids[i]]
+            if free:
+                _worker_slot = free[0]
+                pids[_worker_slot] = os.getpid()
+                _worker_batches[_worker_slot] = 0
+        if _worker_slot is not None:
+            mp.util.Finalize(None, _release_slot, args=(pids, _worker_slot),
+                             exitpriority=10)
+    if threads is not None:
+        _limit_threads(threads)
+    if cpu_sets:
+        with occupancy.get_lock():
+            index = min(range(len(cpu_sets)), key=lambda i: occupancy[i])
+            occupancy[index] += 1
+        mp.util.Finalize(None, _release_cpu_set, args=(occupancy, index),
+                         exitpriority=10)
+        _worker_cpu_set = index
+        os.sched_setaffinity(0, cpu_sets[index])
+
+
+def _call_with(func, values):
+    """
+    Call a function with the parameter values it takes, by name.
+
+    :param func: A function whose arguments are named after parameters.  If
+      it takes ``**kwargs``, it gets every value.
+    :param dict values: Parameter values, by name.
+    :return: Return value of ``func``.
+    """
+    names = _arg_names(func)
+    if names is None:
+        return func(**values)
+    return func(**{name: values[name] for name in names})
+
+
+def _arg_names(func):
+    """
+    Return the names of a function's arguments.
+
+    :param func: A function.
+    :return: List of names, or None if it takes ``**kwargs``.
+    """
+    parameters = inspect.signature(func).parameters.values()
+    if any(p.kind == p.VAR_KEYWORD for p in parameters):
+        return None
+    return [p.name for p in parameters]
+
+
+# Largest batch that chunksize='auto' will make, to bound the memory held by
+# a batch and its results.
+_MAX_BATCH = 4096
+
+
+def _take(configurations, chunksize):
+    """
+    Draw the next batch of configurations.
+
+    :param configurations: Iterator of configurations.
+    :param chunksize: Number of configurations per batch, or a callable
+      returning the size of the next batch.
+    :return: A list of up to ``chunksize`` configurations (empty once the
+      iterator is exhausted).
+    """
+    if callable(chunksize):
+        chunksize = chunksize()
+    return list(it.islice(configurations, chunksize))
+
+
+def _run_batch(configurations, batch_id=None):
+    """
+    Run a batch of configurations on this worker's experiment.
+
+    :param list configurations: Configurations to run.
+    :param int batch_id: ID of the batch, noted in this worker's slot of the
+      pool's table of running batches (see :func:`_init_worker`).
+    :return: See :func:`Experiment._wrapper_batch`.
+    """
+    if _worker_slot is not None:
+        _worker_batches[_worker_slot] = batch_id
+    return _worker_experiment._wrapper_batch(configurations)
+
+
+class ResultCache(object):
+    """
+    A content-addressed, size-bounded, on-disk cache of task results.
+
+    Results are stored under a hash of the experiment's class, its
+    :attr:`Experiment.cache_version` and the configuration, so the cache can
+    be shared between runs of different experiments, and between runs of the
+    same experiment over different parameter grids.  When a grid is
+    expanded, only the new cells are computed; the rest are read back from
+    the cache.  Bump ``cache_version`` whenever a change to :func:`task`
+    should invalidate old results.
+
+    Once the cache holds more than ``max_entries`` results or ``max_bytes``
+    of pickled data, the least recently used results are evicted.
+
+    Unlike a :class:`Journal`, which records the progress of one run, the
+    cache is meant to live across many.
+    """
+
+    def __init__(self, path, max_entries=None, max_bytes=None):
+        """
+        **Constructor**
+
+        :param str path: Path of the database file (created if missing).
+        :param int max_entries: Maximum number of results to keep.
+        :param int max_bytes: Maximum total size of pickled results to keep.
+        :return: None
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._db = _connect(path)
+        self._db.execute('CREATE TABLE IF NOT EXISTS results (key TEXT '
+                         'PRIMARY KEY, value BLOB, size INTEGER, used REAL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS results_used '
+                         'ON results (used)')
+        self._db.commit()
+
+    @staticmethod
+    def key(experiment, configuration):
+        """
+        Return the key a result is stored under.
+
+        :param Experiment experiment: The experiment the result is from.
+        :param tuple configuration: The configuration.
+        :return: A hex digest.
+        """
+        cls = type(experiment)
+        text = repr((cls.__module__, cls.__qualname__,
+                     experiment.cache_version, tuple(configuration)))
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def __len__(self):
+        """Return the number of cached results."""
+        return self._db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def get(self, experiment, configuration):
+        """
+        Look up a cached result (and mark it as recently used).
+
+        :param Experiment experiment: The experiment the result is from.
+        :param tuple configuration: The configuration.
+        :return: A ``(found, retval)`` pair.
+        """
+        key = self.key(experiment, configuration)
+        row = self._db.execute('SELECT value FROM results WHERE key = ?',
+                               (key,)).fetchone()
+        if row is None:
+            return False, None
+        self._db.execute('UPDATE results SET used = ? WHERE key = ?',
+                         (time.time(), key))
+        self._db.commit()
+        return True, pickle.loads(row[0])
+
+    def put(self, experiment, configuration, retval):
+        """
+        Store a result, evicting old ones if the cache is over its limits.
+
+        :param Experiment experiment: The experiment the result is from.
+        :param tuple configuration: The configuration.
+        :param retval: The value returned by :func:`Experiment.task`.
+        :return: None
+        """
+        blob = pickle.dumps(retval)
+        self._db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                         (self.key(experiment, configuration), blob,
+                          len(blob), time.time()))
+        self._evict()
+        self._db.commit()
+
+    def _evict(self):
+        """Delete least recently used results until within the limits."""
+        if self.max_entries is not None:
+            self._db.execute(
+                'DELETE FROM results WHERE key IN (SELECT key FROM results '
+                'ORDER BY used DESC LIMIT -1 OFFSET ?)', (self.max_entries,))
+        if self.max_bytes is not None:
+            self._db.execute(
+                'DELETE FROM results WHERE key IN (SELECT key FROM (SELECT '
+                'key, SUM(size) OVER (ORDER BY used DESC) AS total FROM '
+                'results) WHERE total > ?)', (self.max_bytes,))
+
+    def close(self):
+        """Close the database."""
+        self._db.close()
+
+
+class RuntimeModel(object):
+    """
+    An online model of how long an experiment's tasks take.
+
+    For each parameter, the model keeps the mean run time of the completed
+    tasks that had each value of that parameter.  A configuration's run time
+    is predicted as the overall mean, scaled by how much slower or faster
+    than average each of its parameter values has been.  Values that
+    haven't been seen yet are assumed to be as slow as the slowest value
+    seen for that parameter, so that unexplored (possibly expensive) cells
+    are tried early.
+    """
+
+    def __init__(self, names):
+        """
+        **Constructor**
+
+        :param list names: Names of the parameters, in configuration order.
+        :return: None
+        """
+        self.names = list(names)
+        self.observations = 0
+        self.total = 0.0
+        self._stats = [{} for _ in self.names]
+
+    @staticmethod
+    def _key(value):
+        """Return a hashable stand-in for a parameter value."""
+        try:
+            hash(value)
+            return value
+        except TypeError:
+            return repr(value)
+
+    def observe(self, configuration, seconds):
+        """
+        Add the run time of a completed task to the model.
+
+        :param tuple configuration: The task's configuration.
+        :param float seconds: How long the task took.
+        :return: None
+        """
+        self.observations += 1
+        self.total += seconds
+        for stats, value in zip(self._stats, configuration):
+            entry = stats.setdefault(self._key(value), [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+
+    def predict(self, configuration):
+        """
+        Predict how long a task will take.
+
+        :param tuple configuration: The task's configuration.
+        :return: Predicted run time in seconds (0 before any observations).
+        """
+        if not self.observations:
+            return 0.0
+        mean = self.total / self.observations
+        prediction = mean
+        for stats, value in zip(self._stats, configuration):
+            entry = stats.get(self._key(value))
+            if entry is not None:
+                prediction *= entry[0] / entry[1] / mean
+            elif stats:
+                prediction *= max(t / n for t, n in stats.values()) / mean
+        return prediction
+
+    def timings(self):
+        """
+        Return the mean run time for each value of each parameter.
+
+        :return: Dict mapping each parameter name to a dict from its values
+          to their mean run time in seconds.
+        """
+        return OrderedDict(
+            (name, {value: t / n for value, (t, n) in stats.items()})
+            for name, stats in zip(self.names, self._stats))
+
+    def copy(self):
+        """
+        Return a copy of the model, which later observations don't change.
+
+        :return: A :class:`RuntimeModel`.
+        """
+        model = RuntimeModel(self.names)
+        model.observations = self.observations
+        model.total = self.total
+        model._stats = [{value: list(entry) for value, entry in stats.items()}
+                        for stats in self._stats]
+        return model
 
 
 class Experiment(object):
@@ -21,8 +715,9 @@ class Experiment(object):
     or in parallel across many processes (simply use the ``mp`` argument to
     :func:`run()`, which defaults to True).  If you're using lots of data in
     parallel, you should know that all class data will get copied to the new
-    processes when they're forked.  You need to be a bit clever with your
-    storage of large datasets if that's going to be an issue.
+    processes when they're forked.  For large NumPy arrays and DataFrames,
+    use :func:`share()`, which stores them once in memory-mapped files that
+    every worker maps read-only, instead of copying them.
 
     In order to use this class, subclass it. You must override:
 
@@ -37,6 +732,10 @@ class Experiment(object):
     """
     __metaclass__ = ABCMeta
 
+    #: Version of :func:`task`, for :class:`ResultCache`.  Change this
+    #: whenever cached results from older code should no longer be used.
+    cache_version = None
+
     def __init__(self, silent=False):
         """
         **Constructor**
@@ -49,8 +748,104 @@ class Experiment(object):
         """
         self._silent = silent
         self._params = OrderedDict()
+        self._constraints = []
         self.__completed = 0
         self.__num_configs = 0
+        self.__journal = None
+        self.__cache = None
+        self.__shared = {}
+        self.__schedule = None
+        self.__model = None
+        self.__measure = False
+        self.__telemetry = None
+        self.__telemetry_file = None
+        self.__drawn = {}
+        self.__started = None
+        self.__total = None
+        self.__timeout = None
+        self.__retries = 0
+        self.__failures = []
+        self.__batch_time = None
+        self.__workers = 1
+        self.__sink = None
+        self.__given = None
+        self.__score = None
+        self.__scores = {}
+
+    def __getstate__(self):
+        """
+        Return the state to pickle.
+
+        Run-time state that only makes sense in the parent process (such as
+        the open :class:`Journal` and :class:`ResultCache`) is left out, as
+        is the data of shared datasets (see :func:`share`), which are mapped
+        from disk again instead.
+
+        :return: A copy of the instance dictionary.
+        """
+        state = self.__dict__.copy()
+        for name in ('journal', 'cache', 'model', 'telemetry',
+                     'telemetry_file', 'drawn', 'failures', 'sink', 'given',
+                     'score', 'scores'):
+            state['_Experiment__' + name] = None
+        for name in self.__shared:
+            state[name] = None
+        return state
+
+    def _worker_state(self):
+        """
+        Return the state to pickle when shipping the experiment to workers.
+
+        This is :func:`__getstate__`, without constraints and dependent
+        parameters (which are often lambdas): workers don't enumerate
+        configurations, so they don't need them.  See :class:`_WorkerPayload`.
+
+        :return: A copy of the instance dictionary.
+        """
+        state = self.__getstate__()
+        state['_params'] = OrderedDict(
+            (name, None if callable(values) else values)
+            for name, values in self._params.items())
+        state['_constraints'] = []
+        return state
+
+    def __setstate__(self, state):
+        """
+        Restore a pickled experiment, re-attaching its shared datasets.
+
+        :param dict state: Value returned by :func:`__getstate__`.
+        :return: None
+        """
+        self.__dict__.update(state)
+        for name, descriptor in self.__shared.items():
+            setattr(self, name, _load_shared(descriptor))
+
+    def share(self, name, value, directory=None):
+        """
+        Make a large dataset available to workers without copying it.
+
+        The array or DataFrame is written once to ``.npy`` files, and
+        replaced by a read-only memory-mapped view of them, which is stored
+        as the attribute ``name``.  When the experiment is sent to workers,
+        only the file paths are pickled; each worker maps the same files, so
+        all processes share one copy in the page cache.  The files are
+        deleted when this experiment object is garbage collected (or at
+        exit).
+
+        For a :class:`DistributedBackend` with workers on other hosts, pass a
+        ``directory`` on a filesystem that all of them can see.
+
+        :param str name: Attribute to store the dataset in.
+        :param value: A NumPy array or pandas DataFrame.
+        :param str directory: Where to create the files.  Default is the
+          system temporary directory.
+        :return: The read-only view (also stored as ``self.<name>``).
+        """
+        path = tempfile.mkdtemp(prefix='smbio-%s-' % name, dir=directory)
+        weakref.finalize(self, shutil.rmtree, path, ignore_errors=True)
+        self.__shared[name] = _dump_shared(value, path)
+        setattr(self, name, _load_shared(self.__shared[name]))
+        return getattr(self, name)
 
     @abstractmethod
     def task(self, configuration):
@@ -63,7 +858,13 @@ class Experiment(object):
         passed on to the :func:`result` function.
 
         When the experiment is run multiprocessing, it is run in a separate
-        process!
+        process!  When it is run with threads, it is run in a separate
+        thread.
+
+        This may also be an ``async def`` coroutine function.  In the
+        ``'asyncio'`` mode of :func:`run`, many of them are awaited
+        concurrently on one event loop; in other modes, each is simply run
+        to completion.
 
         :param tuple configuration: A list of parameter values.  The order is
           the order they were added to ``self._params``.
@@ -71,6 +872,24 @@ class Experiment(object):
         """
         pass
 
+    def task_batch(self, columns):
+        """
+        Optional vectorized version of :func:`task`, for a whole batch.
+
+        If this is overridden, it is called once per batch of configurations
+        (see the ``chunksize`` argument of :func:`run`) instead of calling
+        :func:`task` for each one, so a NumPy implementation can replace
+        thousands of Python-level calls.  :func:`task` need not be overridden
+        then, except for the ``'asyncio'`` mode, which always uses it.  If
+        the call raises, every configuration in the batch fails.
+
+        :param OrderedDict columns: For each parameter, by name, a NumPy
+          array of its values in the batch, one per configuration.
+        :return: A sequence with the result of each configuration, in order,
+          which are passed to :func:`result` one at a time.
+        """
+        raise NotImplementedError('Experiment.task_batch')
+
     @abstractmethod
     def result(self, retval):
         """
@@ -83,14 +902,440 @@ class Experiment(object):
         process, so you can be sure that you will not have any issues
         updating a single data structure.
 
+        With millions of results, keeping them all in memory may not be an
+        option.  Pass a sink from :mod:`smbio.util.sink` to :func:`run`
+        instead, and the results are streamed to disk in place of calling
+        this function.
+
         :param retval: The value returned by run_task().
         :return: None
         """
         pass
 
     def configs(self):
-        """Return an iterable of all configurations for the experiment."""
-        return it.product(*self._params.values())
+        """
+        Return an iterable of all configurations for the experiment.
+
+        That's every combination of parameter values, with two exceptions.
+        A parameter whose values are given by a function (a "dependent"
+        parameter) gets them by calling it with the values already chosen
+        for the parameters before it, by argument name.  And combinations
+        rejected by any predicate in ``self._constraints`` (also called with
+        parameter values by argument name) are skipped.  Each constraint is
+        checked as soon as the parameters it names are chosen, so pruned
+        regions of a big grid are never enumerated.  For instance::
+
+            self._params['n'] = [10, 100, 1000]
+            self._params['k'] = lambda n: range(1, n, n // 10)
+            self._constraints.append(lambda n, k: k * k <= n)
+        """
+        if not self._constraints and not any(
+                callable(values) for values in self._params.values()):
+            return it.product(*self._params.values())
+        return self.__expand((), self.__checkpoints())
+
+    def __checkpoints(self):
+        """
+        Return the constraints to check after choosing each parameter.
+
+        :return: List with, for each parameter, the constraints whose
+          arguments are all chosen once that parameter is.
+        """
+        names = list(self._params)
+        checkpoints = [[] for _ in names]
+        for constraint in self._constraints:
+            args = _arg_names(constraint)
+            last = (len(names) - 1 if args is None else
+                    max((names.index(arg) for arg in args), default=0))
+            checkpoints[last].append(constraint)
+        return checkpoints
+
+    def __values(self, name, chosen):
+        """
+        Return the values a parameter can take, given the ones before it.
+
+        :param str name: The parameter.
+        :param dict chosen: Values of the parameters before it, by name.
+        :return: Sequence of values.
+        """
+        values = self._params[name]
+        if callable(values):
+            values = _call_with(values, chosen)
+        return values
+
+    def __allowed(self, checkpoint, chosen):
+        """
+        Return whether chosen parameter values pass a list of constraints.
+
+        :param list checkpoint: Constraints.
+        :param dict chosen: Parameter values, by name.
+        :return: Boolean.
+        """
+        return all(_call_with(constraint, chosen) for constraint in checkpoint)
+
+    def __expand(self, prefix, checkpoints):
+        """
+        Yield the allowed configurations that start with a prefix.
+
+        :param tuple prefix: Values of the first few parameters.
+        :param list checkpoints: Value of :func:`__checkpoints`.
+        :return: Generator of configurations.
+        """
+        names = list(self._params)
+        if len(prefix) == len(names):
+            yield prefix
+            return
+        chosen = dict(zip(names, prefix))
+        name = names[len(prefix)]
+        for value in self.__values(name, chosen):
+            chosen[name] = value
+            if self.__allowed(checkpoints[len(prefix)], chosen):
+                yield from self.__expand(prefix + (value,), checkpoints)
+
+    def sample(self, n, method='random', seed=None):
+        """
+        Draw a sample of configurations, for :func:`run` with ``configs=``.
+
+        Every parameter's values must be a sequence (or a function returning
+        one).  With ``method='random'``, configurations are drawn uniformly
+        and independently, without repeats, until there are ``n`` of them
+        (or many more draws than that have been rejected by constraints).
+        With ``method='lhs'`` (Latin hypercube sampling), each parameter's
+        range is split into ``n`` equal strata, and each stratum is used by
+        exactly one of the ``n`` draws, so every parameter's range is
+        covered evenly even when ``n`` is small.  Draws that fail a
+        constraint, and repeats, are dropped, so there may be fewer than
+        ``n``.
+
+        :param int n: Number of configurations.
+        :param str method: ``'random'`` or ``'lhs'``.
+        :param seed: Seed for the random number generator.
+        :return: List of configurations.
+        """
+        if method not in ('random', 'lhs'):
+            raise ValueError('Experiment.sample: unknown method %r' % method)
+        rng = random.Random(seed)
+        names = list(self._params)
+        checkpoints = self.__checkpoints()
+        if method == 'lhs':
+            strata = []
+            for _ in names:
+                order = list(range(n))
+                rng.shuffle(order)
+                strata.append(order)
+            draws = ([(strata[i][j] + rng.random()) / n
+                      for i in range(len(names))] for j in range(n))
+        else:
+            draws = ([rng.random() for _ in names] for _ in range(100 * n))
+        sample = OrderedDict()
+        for fractions in draws:
+            chosen = {}
+            for name, fraction, checkpoint in zip(names, fractions,
+                                                  checkpoints):
+                values = self.__values(name, chosen)
+                if not len(values):
+                    break
+                chosen[name] = values[int(fraction * len(values))]
+                if not self.__allowed(checkpoint, chosen):
+                    break
+            else:
+                sample[tuple(chosen[name] for name in names)] = None
+                if len(sample) == n:
+                    break
+        return list(sample)
+
+    def successive_halving(self, resource, budgets, score, configs=None,
+                           eta=3, **kwargs):
+        """
+        Search for the best configurations by successive halving.
+
+        Every candidate configuration is first run with the smallest budget,
+        which is substituted for the value of the ``resource`` parameter
+        (say, a number of training epochs or samples).  Only the best
+        ``1/eta`` of them, according to ``score``, go on to the next budget,
+        and so on.  So most of the time is spent on the promising
+        configurations, rather than on running every one at full budget.
+        Results from every round go to :func:`result` (or the sink) as usual.
+        Candidates that differ only in ``resource`` are run once per round.
+        Results replayed from a cache or journal are scored like new ones,
+        but a journal that doesn't store results can't be scored, so its
+        configurations drop out of the search.
+
+        :param str resource: Name of the parameter that sets the budget.
+        :param list budgets: Increasing budgets, one per round.
+        :param score: Function from a task's return value to a score; lower
+          is better.
+        :param configs: Candidate configurations (the ``resource`` value in
+          them is ignored).  Default is :func:`configs`, though a sample from
+          :func:`sample` is the usual choice for a big space.
+        :param int eta: Fraction of configurations (one in ``eta``) that
+          survive each round.
+        :param kwargs: Passed to :func:`run` for each round.
+        :return: List of ``(configuration, score)`` pairs from the last
+          round, best first.
+        """
+        index = list(self._params).index(resource)
+        survivors = list(self.configs() if configs is None else configs)
+        ranked = []
+        for round_, budget in enumerate(budgets):
+            candidates = list(OrderedDict.fromkeys(
+                c[:index] + (budget,) + c[index + 1:] for c in survivors))
+            self.__score = score
+            self.__scores = {}
+            try:
+                self.run(configs=candidates, **kwargs)
+            finally:
+                self.__score = None
+            scores = self.__scores
+            ranked = sorted((c for c in candidates if c in scores),
+                            key=scores.get)
+            ranked = [(c, scores[c]) for c in ranked]
+            if round_ < len(budgets) - 1:
+                survivors = [c for c, _ in ranked[:max(1, len(ranked) // eta)]]
+        return ranked
+
+    def cost(self, configuration):
+        """
+        Estimate how expensive a configuration is to run.
+
+        Override this to use ``schedule='cost'`` in :func:`run`, which runs
+        the most expensive configurations first.  Only the order of the
+        estimates matters, so any unit will do.
+
+        :param tuple configuration: The configuration.
+        :return: The estimated cost, as a number.
+        """
+        raise NotImplementedError('Experiment.cost must be overridden to use '
+                                  'schedule="cost"')
+
+    def telemetry(self):
+        """
+        Return the per-task records from the latest run, as a DataFrame.
+
+        Records are only kept when :func:`run` is called with
+        ``telemetry=True``.  Each row has the ``configuration``, the ``pid``
+        of the worker that ran it, the ``queue_wait`` in seconds between the
+        configuration being drawn and the task starting, the ``seconds`` the
+        task ran, the worker's ``peak_rss`` in bytes so far, the
+        ``result_bytes`` of the pickled return value, whether it was a
+        ``success``, and the time it ``finished`` (as a UNIX timestamp).
+
+        :return: A :class:`pandas.DataFrame`, with one row per task.
+        """
+        import pandas as pd
+        return pd.DataFrame(self.__telemetry or [], columns=[
+            'configuration', 'pid', 'queue_wait', 'seconds', 'peak_rss',
+            'result_bytes', 'success', 'finished'])
+
+    def __record(self, configuration, success, seconds, stats):
+        """
+        Add a per-task telemetry record, in memory or to the JSONL stream.
+
+        :param tuple configuration: The configuration.
+        :param bool success: Whether the task succeeded.
+        :param float seconds: How long the task ran.
+        :param tuple stats: ``(pid, started, peak_rss, result_bytes)``, from
+          :func:`_stats`.
+        :return: None
+        """
+        pid, started, peak_rss, result_bytes = stats
+        drawn = self.__drawn.pop(Journal.key(configuration), started)
+        record = OrderedDict([
+            ('configuration', configuration), ('pid', pid),
+            ('queue_wait', max(0.0, started - drawn)), ('seconds', seconds),
+            ('peak_rss', peak_rss), ('result_bytes', result_bytes),
+            ('success', success), ('finished', time.time())])
+        if self.__telemetry_file is not None:
+            self.__telemetry_file.write(json.dumps(record, default=repr))
+            self.__telemetry_file.write('\n')
+        else:
+            self.__telemetry.append(record)
+
+    def _stats(self, value, started):
+        """
+        Measure a finished task for telemetry (in the worker).
+
+        :param value: The task's return value (or exception).
+        :param float started: When the task started (UNIX timestamp).
+        :return: ``(pid, started, peak_rss, result_bytes)``, or None if
+          telemetry is off.
+        """
+        if not self.__measure:
+            return None
+        try:
+            size = len(pickle.dumps(value))
+        except Exception:
+            size = None
+        return os.getpid(), started, _peak_rss(), size
+
+    def failures(self):
+        """
+        Return the configurations that failed in the latest run.
+
+        These are the configurations whose task raised an exception (or
+        timed out, or killed the worker process running it) on every attempt
+        allowed by the ``retries`` argument of :func:`run`.
+
+        :return: A list of ``(configuration, exception)`` pairs.  The
+          exception's message holds the stack trace of the last attempt.
+        """
+        return list(self.__failures)
+
+    def timings(self):
+        """
+        Return the per-parameter timing data from the latest run.
+
+        :return: See :func:`RuntimeModel.timings`.  Empty if the experiment
+          hasn't been run.
+        """
+        if self.__model is None:
+            return OrderedDict()
+        return self.__model.timings()
+
+    def __count_configs(self):
+        """
+        Return the number of configurations, if it is cheap to tell.
+
+        :return: The number, or None if :func:`configs` is overridden with
+          something that has no length, or the space has constraints or
+          dependent parameters.
+        """
+        configs = self.configs() if self.__given is None else self.__given
+        try:
+            return len(configs)
+        except TypeError:
+            pass
+        if (type(self).configs is not Experiment.configs or
+                self.__given is not None or self._constraints):
+            return None
+        try:
+            total = 1
+            for values in self._params.values():
+                total *= len(values)
+            return total
+        except TypeError:
+            return None
+
+    def __auto_chunksize(self):
+        """
+        Return the size of the next batch, for ``chunksize='auto'``.
+
+        Until a task has completed for each worker, batches hold a single
+        configuration, and those tasks are the timing sample.  After that, a
+        batch holds as many configurations as fit in the target batch time
+        at the mean run time so far.  Batches are kept small enough to give
+        each worker at least two of the configurations that remain, so a few
+        big batches at the end don't leave the other workers idle.
+
+        :return: Number of configurations for the next batch.
+        """
+        model = self.__model
+        if model.observations < self.__workers:
+            return 1
+        mean = model.total / model.observations
+        size = _MAX_BATCH
+        if mean > 0:
+            size = min(size, int(self.__batch_time / mean))
+        if self.__total is not None:
+            remaining = self.__total - self.__num_configs
+            size = min(size, remaining // (2 * self.__workers))
+        return max(1, size)
+
+    def __scheduled(self, lock=None):
+        """
+        Return the configurations to run, in the order to run them.
+
+        With no schedule, that's the order :func:`configs` gives them, and
+        they're drawn lazily.  Otherwise, they're all read in first, and then
+        either sorted by :func:`cost`, most expensive first, or (for the
+        ``'adaptive'`` schedule) handed out most-expensive-first according to
+        the :class:`RuntimeModel` learned from the tasks completed so far.
+        The remaining configurations are re-sorted each time the number of
+        observations has grown by a quarter, so there are only logarithmically
+        many sorts.
+
+        :param lock: Lock held while the model is updated, if results may be
+          arriving from another thread.
+        :return: Iterable of configurations.
+        """
+        configs = self.configs() if self.__given is None else self.__given
+        if self.__schedule is None:
+            return configs
+        if self.__schedule == 'cost':
+            return sorted(configs, key=self.cost, reverse=True)
+        return self.__adaptive(list(configs), lock)
+
+    def __adaptive(self, remaining, lock=None):
+        """
+        Yield configurations, most expensive first, by the runtime model.
+
+        Results may be added to the model by another thread while this one
+        sorts, so each sort uses a copy of the model, taken under ``lock``.
+
+        :param list remaining: The configurations.
+        :param lock: Lock held while the model is updated (if any).
+        :return: Generator of configurations.
+        """
+        model = self.__model
+        remaining.reverse()
+        sorted_at = 0
+        while remaining:
+            if model.observations > max(1.25 * sorted_at, sorted_at + 1):
+                with lock or nullcontext():
+                    snapshot = model.copy()
+                remaining.sort(key=snapshot.predict)
+                sorted_at = snapshot.observations
+            yield remaining.pop()
+
+    def _pending(self, lock=None):
+        """
+        Return the configurations that still need to be run.
+
+        Configurations recorded in the journal (if any) are skipped, and
+        their stored results are replayed into :func:`result` (or the sink).
+        Likewise, configurations found in the result cache (if any) are
+        skipped, and the cached results are used.
+
+        :param lock: Lock to hold while calling :func:`result`, if results
+          may also be arriving from another thread.
+        :return: Generator of configurations.
+        """
+        journal, cache = self.__journal, self.__cache
+        for configuration in self.__scheduled(lock):
+            self.__num_configs += 1
+            if journal is not None and configuration in journal:
+                stored, retval = journal.get(configuration)
+            else:
+                stored, retval = (cache.get(self, configuration)
+                                  if cache is not None else (False, None))
+                if not stored:
+                    # Only configurations that will run get a telemetry
+                    # record, which is what takes them out of __drawn.
+                    if self.__measure:
+                        self.__drawn[Journal.key(configuration)] = time.time()
+                    yield configuration
+                    continue
+                if journal is not None:
+                    journal.record(configuration, retval)
+            with lock or nullcontext():
+                self.__completed += 1
+                if stored:
+                    if self.__score is not None:
+                        self.__scores[configuration] = self.__score(retval)
+                    self.__emit(retval)
+
+    def _save(self, configuration, retval):
+        """
+        Record a completed configuration in the journal and cache (if any).
+
+        :param tuple configuration: The configuration.
+        :param retval: The value returned by :func:`task`.
+        :return: None
+        """
+        if self.__journal is not None:
+            self.__journal.record(configuration, retval)
+        if self.__cache is not None:
+            self.__cache.put(self, configuration, retval)
 
     @staticmethod
     def _err(exception):
@@ -112,15 +1357,110 @@ class Experiment(object):
 
         This function is called by the multiprocessing module when a task is
         completed.  It does a little bit of bookkeeping, and then calls the
-        user-defined callback.
+        user-defined callback (or writes the result to the sink given to
+        :func:`run`).
 
         :param retval: Value returned by :func:`task`.
         :return: None
         """
         self.__completed += 1
         if not self._silent:
-            print('Completed %d/%d.' % (self.__completed, self.__num_configs))
-        self.result(retval)
+            elapsed = time.time() - self.__started
+            rate = self.__completed / elapsed if elapsed > 0 else 0.0
+            total = self.__total or self.__num_configs
+            eta = (datetime.timedelta(seconds=round((total - self.__completed)
+                                                    / rate))
+                   if rate else '?')
+            print('Completed %d/%d (%.1f tasks/s, ETA %s).' % (
+                self.__completed, total, rate, eta))
+        self.__emit(retval)
+
+    def __emit(self, retval):
+        """
+        Pass a result to the run's sink, or else to :func:`result`.
+
+        :param retval: Value returned by :func:`task`.
+        :return: None
+        """
+        if self.__sink is not None:
+            self.__sink.write(retval)
+        else:
+            self.result(retval)
+
+    def _call_task(self, configuration):
+        """
+        Call :func:`task`, running it to completion if it is a coroutine.
+
+        If a timeout was given to :func:`run`, the task is interrupted with
+        a :class:`TimeoutError` once it runs that long.  For an ``async def``
+        task, that's done by cancelling it.  Otherwise it's done with
+        ``SIGALRM``, which only works on Unix, in the main thread of a
+        process (so :func:`run` refuses a timeout in ``'threads'`` mode, and
+        for synchronous tasks in ``'asyncio'`` mode), and only once control
+        returns to the Python interpreter.
+
+        :param configuration: Passed to :func:`task`.
+        :return: Return value from :func:`task`.
+        """
+        return self.__timed(self.task, configuration)
+
+    def __timed(self, func, argument, tasks=1):
+        """
+        Call :func:`task` or :func:`task_batch`, under the run's timeout.
+
+        :param func: The function.
+        :param argument: Its argument.
+        :param int tasks: Number of tasks the call does.  The timeout is per
+          task, so the call gets that many times the timeout.
+        :return: Its return value (run to completion if it is a coroutine).
+        """
+        limit = self.__timeout * tasks if self.__timeout else None
+        timeout = limit
+        if (not timeout or not hasattr(signal, 'setitimer') or
+                threading.current_thread() is not threading.main_thread()):
+            timeout = None
+        if timeout is not None:
+            previous = signal.signal(signal.SIGALRM, _alarm(timeout))
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        try:
+            retval = func(argument)
+            if inspect.iscoroutine(retval):
+                retval = asyncio.run(asyncio.wait_for(retval, limit))
+            return retval
+        finally:
+            if timeout is not None:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, previous)
+
+    async def _wrapper_async(self, configuration):
+        """
+        Await :func:`task` for one configuration, catching any exception.
+
+        Synchronous tasks are run in a thread, so they don't block the event
+        loop.  Failed attempts are retried, as in :func:`_wrapper_batch`.
+        Only an ``async def`` task can be timed out (by cancelling it); a
+        thread can't be stopped, so :func:`run` refuses a timeout otherwise.
+
+        :param configuration: Passed to :func:`task`.
+        :return: A ``(configuration, success, value, seconds, stats)`` tuple,
+          as in :func:`_wrapper_batch`.
+        """
+        started, start = time.time(), time.perf_counter()
+        for _ in range(self.__retries + 1):
+            try:
+                if inspect.iscoroutinefunction(self.task):
+                    value = await asyncio.wait_for(self.task(configuration),
+                                                   self.__timeout)
+                else:
+                    value = await asyncio.to_thread(self._call_task,
+                                                    configuration)
+                success = True
+                break
+            except Exception:
+                value = Exception("".join(traceback.format_exc()))
+                success = False
+        return (configuration, success, value, time.perf_counter() - start,
+                self._stats(value, started))
 
     def _wrapper(self, configuration):
         """
@@ -136,11 +1476,105 @@ class Experiment(object):
         :return: Return value from :func:`task`.
         """
         try:
-            return self.task(configuration)
+            return self._call_task(configuration)
         except Exception:
             raise Exception("".join(traceback.format_exc()))
 
-    def __run_mp(self, processes=None):
+    def _wrapper_batch(self, configurations):
+        """
+        Runs :func:`task` on a batch of configurations.
+
+        This is :func:`_wrapper` for several configurations in one call, so
+        that they cost only one round trip between processes.  Exceptions are
+        caught for each configuration separately, so that one failure doesn't
+        lose the rest of the batch.  A failed task is retried right away, up
+        to the ``retries`` given to :func:`run`.
+
+        :param list configurations: Configurations to pass to :func:`task`.
+        :return: A list with a ``(configuration, success, value, seconds,
+          stats)`` tuple for each configuration.  The value is the return
+          value of :func:`task`, or an exception containing the stack trace,
+          ``seconds`` is how long the task ran, and ``stats`` is its
+          telemetry (see :func:`_stats`).
+        """
+        if type(self).task_batch is not Experiment.task_batch:
+            return self.__wrapper_vectorized(configurations)
+        results = []
+        for configuration in configurations:
+            started, start = time.time(), time.perf_counter()
+            for _ in range(self.__retries + 1):
+                try:
+                    value, success = self._wrapper(configuration), True
+                    break
+                except Exception as e:
+                    value, success = e, False
+            results.append((configuration, success, value,
+                            time.perf_counter() - start,
+                            self._stats(value, started)))
+        return results
+
+    def __wrapper_vectorized(self, configurations):
+        """
+        Runs :func:`task_batch` on a batch of configurations.
+
+        Each configuration is credited with an equal share of the call's run
+        time.  The call may run for the run's timeout times the number of
+        configurations.  Failed calls are retried as a whole.
+
+        :param list configurations: The configurations.
+        :return: Same as :func:`_wrapper_batch`.
+        """
+        import numpy as np
+        columns = OrderedDict(
+            (name, np.asarray([c[i] for c in configurations]))
+            for i, name in enumerate(self._params))
+        started, start = time.time(), time.perf_counter()
+        for _ in range(self.__retries + 1):
+            try:
+                values = list(self.__timed(self.task_batch, columns,
+                                           len(configurations)))
+                if len(values) != len(configurations):
+                    raise ValueError(
+                        'task_batch returned %d results for %d configurations'
+                        % (len(values), len(configurations)))
+                success = True
+                break
+            except Exception:
+                values = Exception("".join(traceback.format_exc()))
+                success = False
+        seconds = (time.perf_counter() - start) / len(configurations)
+        if not success:
+            values = [values] * len(configurations)
+        return [(configuration, success, value, seconds,
+                 self._stats(value, started))
+                for configuration, value in zip(configurations, values)]
+
+    def _cb_batch(self, results):
+        """
+        Receives a batch of results (from :func:`_wrapper_batch`).
+
+        :param list results: ``(configuration, success, value, seconds,
+          stats)`` tuples.
+        :return: None
+        """
+        for configuration, success, value, seconds, stats in results:
+            if stats is not None:
+                self.__record(configuration, success, seconds, stats)
+            else:
+                self.__drawn.pop(Journal.key(configuration), None)
+            if success:
+                self.__model.observe(configuration, seconds)
+                if self.__score is not None:
+                    self.__scores[configuration] = self.__score(value)
+                self._cb(value)
+                self._save(configuration, value)
+            else:
+                self.__failures.append((configuration, value))
+                self._err(value)
+
+    def __run_mp(self, processes=None, chunksize=1, max_inflight=None,
+                 maxtasksperchild=None, threads=None, cpus=None,
+                 start_method=None):
         """
         Runs the experiment using the multiprocessing module.
 
@@ -150,61 +1584,694 @@ class Experiment(object):
         the speed gains of parallelizing outweigh the overhead of spawning
         and IPC.
 
+        Configurations are drawn lazily from :func:`configs`, ``chunksize``
+        at a time, and each batch is sent to a worker as a single task.  At
+        most ``max_inflight`` batches are queued or running at once; once
+        that many are outstanding, submission waits for one to finish.  So
+        the parent never holds more than a few batches' worth of
+        configurations and results, no matter how many there are in total.
+
+        The experiment itself is given to each worker once, when the pool
+        starts (see :func:`_init_worker`).  After that, only batches of
+        configurations and their results cross the process boundary, so the
+        cost of dispatching a task doesn't grow with whatever the experiment
+        accumulates in :func:`result`.
+
+        If a worker dies in the middle of a batch (of a segfault, say, or the
+        OOM killer), the pool replaces it but never returns the batch.  The
+        parent notices (see :func:`_init_worker`), and runs the batch's
+        configurations again, each in a batch of its own.  One that kills
+        its worker more than ``retries`` times is recorded as failed.
+
         :param processes: Number of processes to use in the pool.  Default is
         None. If None is given, the number from multiprocessing.cpu_count()
         is used.
+        :param chunksize: Number of configurations per task sent to a
+        worker, or a callable giving the size of the next batch (see
+        :func:`_take`).
+        :param int max_inflight: Maximum number of batches outstanding at
+        once.  Default is four per process.
+        :param int maxtasksperchild: Number of batches a worker runs before
+        it is replaced with a fresh process (default: never).
+        :param int threads: Maximum number of BLAS/OpenMP threads per worker
+        (default: no limit).
+        :param cpus: CPU sets to pin workers to (see :func:`_cpu_sets`).
+        :param str start_method: ``'fork'``, ``'forkserver'`` or ``'spawn'``
+        (default: the platform's default).
         :return: Blocks until all tasks are complete.  Returns nothing.
         """
         # Setup the class variables used during the experiment.
         self.__completed = 0
+        self.__num_configs = 0
+        processes = processes or mp.cpu_count()
+        if max_inflight is None:
+            max_inflight = 4 * processes
+        context = mp.get_context(start_method)
+        cpu_sets = _cpu_sets(cpus, processes) if cpus else None
+        occupancy = context.Array('i', len(cpu_sets or ()))
+        running = (context.Array('q', 4 * processes),
+                   context.Array('q', 4 * processes))
+        slots = threading.BoundedSemaphore(max_inflight)
+        lock = threading.Condition()
+        outstanding = {}
+        redo = deque()
+        crashes = {}
+        ids = it.count(1)
 
-        # Create a multiprocessing pool and add each configuration task.
-        result_objects = []
-        with mp.Pool(processes=processes) as pool:
-            for configuration in self.configs():
-                result_objects.append(
-                    pool.apply_async(self._wrapper, (configuration,),
-                                     callback=self._cb,
-                                     error_callback=self._err))
-                self.__num_configs += 1
-            if not self._silent:
-                print('Experiment: queued %d tasks.' % self.__num_configs)
-            for result in result_objects:
-                result.wait()
+        def submit(batch):
+            batch_id = next(ids)
+            with lock:
+                outstanding[batch_id] = batch
+
+            def callback(results):
+                with lock:
+                    # Ignore a batch that was already given up for lost.
+                    if outstanding.pop(batch_id, None) is None:
+                        return
+                    try:
+                        self._cb_batch(results)
+                    finally:
+                        slots.release()
+                        lock.notify_all()
+
+            def error_callback(exception):
+                # The batch failed as a whole (say, a result couldn't be
+                # pickled), so run its configurations again one at a time,
+                # and record the one that fails alone.
+                with lock:
+                    batch = outstanding.pop(batch_id, None)
+                    if batch is None:
+                        return
+                    try:
+                        if len(batch) > 1:
+                            redo.extend([configuration]
+                                        for configuration in batch)
+                        else:
+                            self._cb_batch([(batch[0], False, exception, 0.0,
+                                             None)])
+                    finally:
+                        slots.release()
+                        lock.notify_all()
+
+            pool.apply_async(_run_batch, (batch, batch_id), callback=callback,
+                             error_callback=error_callback)
+
+        def recover():
+            # Find the batches of workers that died, and run them again, one
+            # configuration at a time, so the one that kills its worker can
+            # be told from the rest.
+            pids, batches = running
+            with lock:
+                dead = []
+                with pids.get_lock():
+                    for i in range(len(pids)):
+                        if pids[i] and not _alive(pids[i]):
+                            dead.append((pids[i], batches[i]))
+                            pids[i] = 0
+                for pid, batch_id in dead:
+                    batch = outstanding.pop(batch_id, None)
+                    if batch is None:
+                        continue
+                    slots.release()
+                    if len(batch) > 1:
+                        redo.extend([configuration] for configuration in batch)
+                        continue
+                    key = Journal.key(batch[0])
+                    crashes[key] = crashes.get(key, 0) + 1
+                    if crashes[key] <= self.__retries:
+                        redo.append(batch)
+                        continue
+                    self._cb_batch([(batch[0], False, Exception(
+                        'worker process %d died while running this task'
+                        % pid), 0.0, None)])
+
+        # A forked worker inherits BLAS already set up with the parent's
+        # thread count, which only threadpoolctl can change.
+        if (threads is not None and context.get_start_method() == 'fork' and
+                'numpy' in sys.modules and
+                importlib.util.find_spec('threadpoolctl') is None):
+            warnings.warn('Experiment.run: blas_threads has no effect on '
+                          'forked workers once NumPy is loaded, unless '
+                          'threadpoolctl is installed (or start_method is '
+                          '"spawn" or "forkserver")', RuntimeWarning)
+
+        # Create a multiprocessing pool and add each batch of configurations.
+        # Spawned workers (replacements included) load the experiment's
+        # modules, and so perhaps NumPy, before the initializer runs, so the
+        # thread limits stay in the environment for as long as the pool does.
+        configurations = self._pending(lock)
+        payload = pickle.dumps(_WorkerPayload(self))
+        with _thread_environment(threads), context.Pool(
+                processes=processes, initializer=_init_worker,
+                initargs=(payload, threads, cpu_sets, occupancy, running),
+                maxtasksperchild=maxtasksperchild) as pool:
+            exhausted = False
+            while True:
+                while not slots.acquire(timeout=_POLL_INTERVAL):
+                    recover()
+                with lock:
+                    batch = redo.popleft() if redo else None
+                if batch is None and not exhausted:
+                    batch = _take(configurations, chunksize)
+                    if not batch:
+                        exhausted = True
+                        if not self._silent:
+                            print('Experiment: queued %d tasks.'
+                                  % self.__num_configs)
+                if batch:
+                    submit(batch)
+                    continue
+                slots.release()
+                with lock:
+                    if not outstanding and not redo:
+                        break
+                    lock.wait(_POLL_INTERVAL)
+                recover()
             if not self._silent:
                 print('Experiment: completed all tasks.')
 
-    def __run_serial(self):
+    def __run_backend(self, backend, chunksize=1):
+        """
+        Runs the experiment on a pluggable executor backend.
+
+        The backend is handed a lazy iterator of pending configurations and a
+        thread-safe callback for batches of results (see
+        :class:`DistributedBackend` for the interface).
+
+        :param backend: The backend.
+        :param int chunksize: Number of configurations per batch.
+        :return: Blocks until all tasks are complete.  Returns nothing.
+        """
+        self.__completed = 0
+        self.__num_configs = 0
+        lock = threading.Lock()
+
+        def callback(results):
+            with lock:
+                self._cb_batch(results)
+
+        backend.run(self, self._pending(lock), callback, chunksize)
+        if not self._silent:
+            print('Experiment: completed all tasks.')
+
+    def __run_threads(self, threads=None, chunksize=1, max_inflight=None):
+        """
+        Runs the experiment on a pool of threads.
+
+        This avoids the process spawning and pickling overhead of
+        :func:`__run_mp`, which buys nothing for tasks that spend their time
+        waiting (on disk, the network, or subprocesses) rather than holding
+        the GIL.  Configurations are drawn lazily, as in :func:`__run_mp`,
+        and results are passed to :func:`result` on the calling thread.
+
+        :param int threads: Number of threads.  Default is the same as
+          :class:`concurrent.futures.ThreadPoolExecutor`'s.
+        :param int chunksize: Number of configurations per task.
+        :param int max_inflight: Maximum number of batches outstanding at
+          once.  Default is four per thread.
+        :return: Blocks until all tasks are complete.  Returns nothing.
+        """
+        self.__completed = 0
+        self.__num_configs = 0
+        configurations = self._pending()
+        threads = threads or min(32, (os.cpu_count() or 1) + 4)
+        if max_inflight is None:
+            max_inflight = 4 * threads
+        with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+            futures = set()
+            while True:
+                batch = _take(configurations, chunksize)
+                if batch:
+                    futures.add(executor.submit(self._wrapper_batch, batch))
+                if not futures:
+                    break
+                if batch and len(futures) < max_inflight:
+                    continue
+                done, futures = concurrent.futures.wait(
+                    futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    self._cb_batch(future.result())
+        if not self._silent:
+            print('Experiment: completed all tasks.')
+
+    async def __run_asyncio(self, concurrency=None):
+        """
+        Runs the experiment on an asyncio event loop.
+
+        Up to ``concurrency`` calls to :func:`task` are awaited at once
+        (see :func:`_wrapper_async`), and configurations are drawn lazily.
+
+        :param int concurrency: Maximum number of tasks at once.  Default
+          is 100.
+        :return: Returns nothing, once all tasks are complete.
+        """
+        self.__completed = 0
+        self.__num_configs = 0
+        configurations = self._pending()
+        pending = set()
+        while True:
+            for configuration in it.islice(configurations,
+                                           (concurrency or 100) -
+                                           len(pending)):
+                pending.add(asyncio.ensure_future(
+                    self._wrapper_async(configuration)))
+            if not pending:
+                break
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED)
+            self._cb_batch([future.result() for future in done])
+        if not self._silent:
+            print('Experiment: completed all tasks.')
+
+    def __run_serial(self, chunksize=1):
         """
         Runs the experiment in serial.
 
         Runs each task one after another (in serial).  For big, long running
         tasks this is much slower than in parallel.  But, if you have a few
         smaller ones, serial might be more efficient.  I guess.
+
+        :param chunksize: Number of configurations per batch (which only
+          matters for :func:`task_batch`), or a callable giving the size of
+          the next batch.
         """
         self.__completed = 0
-        for config in self.configs():
+        self.__num_configs = 0
+        configurations = self._pending()
+        for batch in iter(lambda: _take(configurations, chunksize), []):
             try:
-                self.result(self.task(config))
-                self.__completed += 1
+                self._cb_batch(self._wrapper_batch(batch))
             except:
                 print("".join(traceback.format_exc()))
-            if not self._silent:
-                print('Experiment: completed %d tasks.' % self.__completed)
         if not self._silent:
             print('Experiment: completed all tasks.')
 
-    def run(self, mp=True, nproc=None):
+    def run(self, mp=True, nproc=None, chunksize=1, max_inflight=None,
+            journal=None, cache=None, backend=None, mode=None,
+            schedule=None, telemetry=None, timeout=None, retries=0,
+            maxtasksperchild=None, batch_time=0.1, sink=None,
+            configs=None, blas_threads=None, cpu_affinity=None,
+            start_method=None):
         """
         Run the experiment.
 
-        :param mp: Whether or not to use multiprocessing.
+        The execution mode is one of:
+
+        - ``'processes'``: a multiprocessing pool (the default).
+        - ``'threads'``: a thread pool, for I/O-bound tasks.
+        - ``'asyncio'``: an event loop, for ``async def`` tasks (synchronous
+          tasks are run in threads).
+        - ``'serial'``: one task after another, in this process.
+
+        :param mp: Whether or not to use multiprocessing (ignored if ``mode``
+          is given; False is the same as ``mode='serial'``).
         :type mp: bool
-        :param nproc: Number of processes to use (ignored unless ``mp==True``).
+        :param nproc: Number of processes or threads to use, or the number
+          of tasks awaited at once in ``'asyncio'`` mode.
         :type nproc: int
+        :param chunksize: Number of configurations sent to a worker at once.
+          Raising this amortizes IPC overhead for short tasks.  ``'auto'``
+          times the first few tasks and then sizes batches so that each takes
+          about ``batch_time`` seconds.  This is also the batch size for
+          :func:`task_batch`.  Ignored in ``'asyncio'`` mode.
+        :type chunksize: int or str
+        :param max_inflight: Maximum number of batches queued or running at
+          once.  Default is four per process or thread.
+        :type max_inflight: int
+        :param journal: A :class:`Journal`, or the path of one, used to
+          checkpoint completed configurations.  If it already holds some
+          (from a run that died), those are skipped and replayed.
+        :type journal: Journal or str
+        :param cache: A :class:`ResultCache`, or the path of one.  Cached
+          results are used instead of running their configurations, and new
+          results are added to it.
+        :type cache: ResultCache or str
+        :param backend: An executor backend to run the tasks on instead (such
+          as a :class:`DistributedBackend`).  If given, ``mp``, ``nproc`` and
+          ``max_inflight`` are ignored.
+        :param mode: The execution mode (see above).
+        :type mode: str
+        :param schedule: The order to run configurations in.  None runs them
+          in the order of :func:`configs`.  ``'cost'`` runs them most
+          expensive first, according to :func:`cost`.  ``'adaptive'`` runs
+          them most expensive first according to the run times of the tasks
+          completed so far, so that slow cells don't all start at the end
+          and leave workers idle.  Either schedule reads in every
+          configuration up front.  Per-parameter timings are collected
+          either way (see :func:`timings`).
+        :type schedule: str
+        :param telemetry: True to keep a record of every task (see
+          :func:`telemetry`), or the path of a JSONL file to stream the
+          records to instead of keeping them in memory.
+        :type telemetry: bool or str
+        :param timeout: Number of seconds after which a task is interrupted
+          with a :class:`TimeoutError` (see :func:`_call_task` for the
+          limitations: notably, a task stuck in C code is only interrupted
+          once it returns to Python).  Threads can't be interrupted, so this
+          is an error in ``'threads'`` mode, and in ``'asyncio'`` mode unless
+          :func:`task` is an ``async def`` coroutine.  A call to
+          :func:`task_batch` gets this much time per configuration in the
+          batch.  Default is no timeout.
+        :type timeout: float
+        :param retries: Number of times to retry a task that raises an
+          exception, times out, or kills its worker process.  Configurations
+          that fail every attempt are listed by :func:`failures`.
+        :type retries: int
+        :param maxtasksperchild: Number of batches a worker process runs
+          before it is replaced (``'processes'`` mode only), so that leaky
+          tasks can't slowly bloat long-lived workers.
+        :type maxtasksperchild: int
+        :param batch_time: Target number of seconds per batch, for
+          ``chunksize='auto'``.
+        :type batch_time: float
+        :param sink: A sink from :mod:`smbio.util.sink` to stream results to
+          instead of calling :func:`result`, so that the parent's memory use
+          doesn't grow with the number of results.  It is closed when the
+          run ends.  Results replayed from the journal or cache are written
+          to it too, so that it always holds every result of the run.  So,
+          when resuming from a journal, give it a new path (or the rows the
+          first run flushed will appear twice).
+        :type sink: smbio.util.sink.Sink
+        :param configs: Configurations to run instead of :func:`configs`
+          (such as a sample from :func:`sample`).
+        :param blas_threads: Maximum number of threads each worker process
+          (in ``'processes'`` mode) may use for BLAS and OpenMP (through the
+          ``OMP_NUM_THREADS`` family of environment variables, and
+          threadpoolctl if it is installed).  When every task runs
+          multithreaded NumPy, ``nproc`` workers with the default thread
+          pools oversubscribe the machine; 1 is usually right when ``nproc``
+          is the number of cores.  The environment variables only reach
+          libraries that a worker loads itself, so with the ``'fork'`` start
+          method and NumPy already loaded, this needs threadpoolctl (a
+          :class:`RuntimeWarning` says so).  Likewise, a forkserver started
+          before this run doesn't see them.
+        :type blas_threads: int
+        :param cpu_affinity: Pin each worker process to a set of CPUs
+          (``'processes'`` mode, Linux only).  True splits the CPUs
+          available to this process evenly between the workers.  Otherwise,
+          a list of CPU sets (say, one per socket), handed out to workers in
+          turn.
+        :type cpu_affinity: bool or list
+        :param start_method: How pool worker processes are started:
+          ``'fork'``, ``'forkserver'`` or ``'spawn'``.  Default is the
+          platform's default.
+        :type start_method: str
         :return: None
         """
-        if mp:
-            self.__run_mp(processes=nproc)
-        else:
-            self.__run_serial()
+        if mode is None:
+            mode = 'processes' if mp else 'serial'
+        if mode not in ('processes', 'threads', 'asyncio', 'serial'):
+            raise ValueError('Experiment.run: unknown mode %r' % mode)
+        if schedule not in (None, 'cost', 'adaptive'):
+            raise ValueError('Experiment.run: unknown schedule %r' % schedule)
+        if (mode == 'asyncio' and backend is None and
+                type(self).task is Experiment.task):
+            raise ValueError('Experiment.run: "asyncio" mode calls task(), '
+                             'which must be overridden')
+        if timeout is not None and mode == 'threads' and backend is None:
+            raise ValueError('Experiment.run: timeout is not supported in '
+                             '"threads" mode')
+        if (timeout is not None and mode == 'asyncio' and backend is None and
+                not inspect.iscoroutinefunction(self.task)):
+            raise ValueError('Experiment.run: timeout in "asyncio" mode needs '
+                             'an async def task()')
+        if chunksize == 'auto':
+            chunksize = self.__auto_chunksize
+        elif not isinstance(chunksize, int) or chunksize < 1:
+            raise ValueError('Experiment.run: bad chunksize %r' % chunksize)
+        opened = []
+        if isinstance(journal, str):
+            journal = Journal(journal)
+            opened.append(journal)
+        if isinstance(cache, str):
+            cache = ResultCache(cache)
+            opened.append(cache)
+        self.__journal = journal
+        self.__cache = cache
+        self.__schedule = schedule
+        self.__model = RuntimeModel(self._params.keys())
+        self.__measure = bool(telemetry)
+        self.__telemetry = [] if telemetry is True else None
+        if isinstance(telemetry, str):
+            self.__telemetry_file = open(telemetry, 'a')
+        self.__drawn = {}
+        self.__timeout = timeout
+        self.__retries = retries
+        self.__failures = []
+        self.__batch_time = batch_time
+        self.__sink = sink
+        self.__given = configs
+        self.__workers = nproc or os.cpu_count()
+        self.__completed = 0
+        self.__num_configs = 0
+        self.__total = self.__count_configs()
+        self.__started = time.time()
+        try:
+            if backend is not None:
+                self.__run_backend(backend, chunksize=chunksize)
+            elif mode == 'processes':
+                self.__run_mp(processes=nproc, chunksize=chunksize,
+                              max_inflight=max_inflight,
+                              maxtasksperchild=maxtasksperchild,
+                              threads=blas_threads, cpus=cpu_affinity,
+                              start_method=start_method)
+            elif mode == 'threads':
+                self.__run_threads(threads=nproc, chunksize=chunksize,
+                                   max_inflight=max_inflight)
+            elif mode == 'asyncio':
+                asyncio.run(self.__run_asyncio(concurrency=nproc))
+            else:
+                self.__run_serial(chunksize=chunksize)
+        finally:
+            self.__journal = None
+            self.__cache = None
+            self.__schedule = None
+            self.__given = None
+            self.__measure = False
+            if self.__telemetry_file is not None:
+                self.__telemetry_file.close()
+                self.__telemetry_file = None
+            for store in opened:
+                store.close()
+            if self.__sink is not None:
+                self.__sink.close()
+                self.__sink = None
+
+
+class DistributedBackend(object):
+    """
+    Runs an experiment's tasks on workers that connect over TCP.
+
+    This is an executor backend for :func:`Experiment.run`.  The parent
+    process becomes a coordinator: it listens on ``address``, sends each
+    worker that connects a pickled copy of the experiment (once), and then
+    hands out batches of configurations as workers ask for them.  Results
+    come back to the parent, where they are passed to
+    :func:`Experiment.result` as usual.  If a worker disconnects in the middle
+    of a batch, each of the batch's configurations is handed to another
+    worker, in a batch of its own.  A configuration whose worker disconnects
+    more than ``redeliveries`` times (because it crashes the worker, say) is
+    given up on, and listed by :func:`Experiment.failures`.  The run is
+    complete when every batch has come back, so it waits for workers if none
+    are connected.  Local workers that die are replaced.
+
+    Workers run :func:`work`.  To start one on another host (which must be
+    able to import the experiment's class), run::
+
+        SMBIO_AUTHKEY=secret python -m smbio.experiment coordinator-host:port
+
+    For local testing, or to use the coordinator's own cores as well, pass
+    ``local_workers`` to start that many worker processes on localhost.
+
+    A backend is any object with a ``run(experiment, configurations,
+    callback, chunksize)`` method, which must run
+    ``experiment._wrapper_batch(batch)`` on batches drawn from the
+    ``configurations`` iterator, and pass each returned list to ``callback``
+    (which may be called from any thread).  ``chunksize`` may be a callable
+    giving the size of the next batch, which :func:`_take` handles.
+    """
+
+    def __init__(self, address=('', 0), authkey=None, local_workers=0,
+                 redeliveries=2):
+        """
+        **Constructor**
+
+        :param tuple address: ``(host, port)`` to listen on.  Port 0 picks a
+          free port; the chosen address is in :attr:`address` once the run
+          starts.
+        :param bytes authkey: Shared secret that workers must know.  Default
+          is this process's authkey, which only local workers inherit, so set
+          it when using remote workers.
+        :param int local_workers: Number of worker processes to start on
+          this host.
+        :param int redeliveries: Number of times a configuration is handed to
+          another worker after its worker disconnects.
+        :return: None
+        """
+        self.address = address
+        self.authkey = authkey
+        self.local_workers = local_workers
+        self.redeliveries = redeliveries
+
+    def run(self, experiment, configurations, callback, chunksize=1):
+        """
+        Run the tasks for every configuration, on whichever workers connect.
+
+        :param Experiment experiment: The experiment.
+        :param configurations: Iterator of configurations to run.
+        :param callback: Called with each list of results from
+          :func:`Experiment._wrapper_batch`.
+        :param chunksize: Number of configurations per batch, or a callable
+          giving the size of the next batch.
+        :return: Blocks until all batches are complete.  Returns nothing.
+        """
+        authkey = self.authkey or mp.current_process().authkey
+        listener = Listener(self.address, authkey=authkey)
+        self.address = listener.address
+        payload = pickle.dumps(_WorkerPayload(experiment))
+        cond = threading.Condition()
+        retry = deque()
+        lost = {}
+        state = {'outstanding': 0, 'exhausted': False, 'closing': False}
+
+        def next_batch():
+            # Return a batch to run, or None once everything has finished.
+            with cond:
+                while True:
+                    if retry:
+                        batch = retry.popleft()
+                        break
+                    if not state['exhausted']:
+                        batch = _take(configurations, chunksize)
+                        if batch:
+                            break
+                        state['exhausted'] = True
+                    if state['outstanding'] == 0:
+                        cond.notify_all()
+                        return None
+                    cond.wait()
+                state['outstanding'] += 1
+                return batch
+
+        def finish(batch, failed):
+            # Returns the configurations to give up on, if any.
+            abandoned = []
+            with cond:
+                state['outstanding'] -= 1
+                if failed and len(batch) > 1:
+                    retry.extend([configuration] for configuration in batch)
+                elif failed:
+                    key = Journal.key(batch[0])
+                    lost[key] = lost.get(key, 0) + 1
+                    if lost[key] <= self.redeliveries:
+                        retry.append(batch)
+                    else:
+                        abandoned = batch
+                cond.notify_all()
+            return abandoned
+
+        def report(results):
+            try:
+                callback(results)
+            except Exception:
+                experiment._err(Exception("".join(traceback.format_exc())))
+
+        def serve(conn):
+            batch = None
+            try:
+                conn.send_bytes(payload)
+                while True:
+                    batch = next_batch()
+                    conn.send(batch)
+                    if batch is None:
+                        return
+                    results = conn.recv()
+                    finished, batch = batch, None
+                    try:
+                        report(results)
+                    finally:
+                        finish(finished, False)
+            except (EOFError, OSError):
+                abandoned = finish(batch, True) if batch is not None else []
+                if abandoned:
+                    report([(configuration, False, Exception(
+                        'worker disconnected while running this task'),
+                        0.0, None) for configuration in abandoned])
+            finally:
+                conn.close()
+
+        def accept():
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception:
+                    if state['closing']:
+                        return
+                    continue
+                threading.Thread(target=serve, args=(conn,),
+                                 daemon=True).start()
+
+        threading.Thread(target=accept, daemon=True).start()
+        host, port = self.address
+        if host in ('', '0.0.0.0'):
+            host = '127.0.0.1'
+        if not experiment._silent:
+            print('Experiment: coordinator listening on %s:%d.' % self.address)
+        workers = []
+        for _ in range(self.local_workers):
+            workers.append(mp.Process(target=work, args=((host, port),
+                                                         authkey)))
+            workers[-1].start()
+
+        with cond:
+            while not (state['exhausted'] and state['outstanding'] == 0 and
+                       not retry):
+                cond.wait(_POLL_INTERVAL)
+                for index, worker in enumerate(workers):
+                    if worker.exitcode not in (None, 0):
+                        workers[index] = mp.Process(
+                            target=work, args=((host, port), authkey))
+                        workers[index].start()
+        for worker in workers:
+            worker.join()
+        # Wake the accepting thread up so that it notices it should stop.
+        state['closing'] = True
+        try:
+            socket.create_connection((host, port)).close()
+        except OSError:
+            pass
+        listener.close()
+
+
+def work(address, authkey=None):
+    """
+    Run tasks for a :class:`DistributedBackend` coordinator until none remain.
+
+    :param tuple address: ``(host, port)`` of the coordinator.
+    :param bytes authkey: The coordinator's authkey.  Default is this
+      process's authkey.
+    :return: None
+    """
+    conn = Client(address, authkey=authkey or mp.current_process().authkey)
+    try:
+        experiment = pickle.loads(conn.recv_bytes()).experiment
+        while True:
+            batch = conn.recv()
+            if batch is None:
+                break
+            conn.send(experiment._wrapper_batch(batch))
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Run tasks for a DistributedBackend coordinator.')
+    parser.add_argument('address', help='coordinator address, as HOST:PORT')
+    parser.add_argument('--authkey', default=os.environ.get('SMBIO_AUTHKEY'),
+                        help='shared secret (default: $SMBIO_AUTHKEY)')
+    args = parser.parse_args()
+    host, _, port = args.address.rpartition(':')
+    work((host, int(port)), args.authkey and args.authkey.encode())
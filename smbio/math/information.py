@@ -1,7 +1,20 @@
 """Contains information-theory related functions."""
 
+import functools
+import heapq
+import multiprocessing as mp
+import os
+import shutil
+import tempfile
+from collections import OrderedDict, namedtuple
+
 import numpy as np
 
+# Beyond this many possible states (and more than one per sample), counting
+# with a dense np.bincount wastes more memory than it is worth, so values are
+# counted sparsely with np.unique instead.
+_DENSE_STATES = 2 ** 20
+
 
 def entropy(l):
     """
@@ -17,19 +30,45 @@ def entropy(l):
 
         :math:`H(X) = - \sum_{x\in X} p(X=x) \log_2(p(X=x))`
 
+    Values are counted with :func:`numpy.bincount`, unless they are so large
+    (relative to the length of the array) that the dense histogram would be
+    mostly empty, in which case only the observed values are counted.
+
     :param l: Array of integers/bools.
     :type l: numpy.array or similar
     :returns: The entropy of the array.
     """
+    l = np.asarray(l)
+    if l.size == 0:
+        return 0.0
+    if np.max(l) >= max(_DENSE_STATES, l.size):
+        return entropy_from_counts(np.unique(l, return_counts=True)[1])
+    return entropy_from_counts(np.bincount(l))
+
+
+def entropy_from_counts(counts, axis=-1):
+    """
+    Return the entropy of a distribution given as a histogram of counts.
 
-    probabilities = np.bincount(l) / len(l)
-    with np.errstate(divide='ignore'):  # ignore log(0) errors, we'll handle
+    This is the second half of :func:`entropy`, split out so that callers who
+    already have counts (or many histograms at once, stacked along one axis)
+    do not need to rebuild the original vector.  Zero counts contribute
+    nothing, as with :func:`entropy`.
+
+    :param counts: Array of non-negative counts.
+    :type counts: numpy.array or similar
+    :param int axis: Axis along which each histogram lies.
+    :returns: The entropy of each histogram (a scalar for 1-D input).
+    """
+    counts = np.asarray(counts)
+    probabilities = counts / np.sum(counts, axis=axis, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):  # we'll handle
         log_probabilities = np.log2(probabilities)
         log_probabilities[~np.isfinite(log_probabilities)] = 0
-    return -np.sum(probabilities * log_probabilities)
+    return -np.sum(probabilities * log_probabilities, axis=axis)
 
 
-def joint_dataset(l1, l2):
+def joint_dataset(l1, l2, compact=False):
     """
     Create a joint dataset for two non-negative integer (boolean) arrays.
 
@@ -37,16 +76,46 @@ def joint_dataset(l1, l2):
     This function will create an array with values [0,N*M), each value
     representing a possible combination of values from l1 and l2.  Essentially,
     this is equivalent to zipping l1 and l2, but much faster by using the NumPy
-    native implementations of elementwise addition and multiplication.
+    native implementations of elementwise addition and multiplication.  The
+    result is given a dtype wide enough to hold N*M, so it can't overflow.
+
+    With ``compact=True``, the result uses the smallest integer dtype that
+    fits.  Furthermore, if N*M is very large, the observed combinations are
+    relabeled to [0,K), where K is the number of distinct combinations that
+    actually occur.  This keeps nested joints (e.g. a joint of a joint) and
+    their histograms proportional to the observed states.  The codes no
+    longer decode to the original values, but any entropy computed from them
+    is unchanged.
 
     :param l1: first integer vector (values within 0-n)
     :type l1: numpy.array or similar
     :param l2: second integer vector (values with 0-m)
     :type l2: numpy.array or similar
+    :param bool compact: use the smallest dtype, and relabel large state
+      spaces to only the observed states
     :returns: integer vector expressing states of both l1 and l2
+    :raises OverflowError: When N*M does not fit in 64 bits and ``compact``
+      is False.
     """
-    N = np.max(l1) + 1
-    return l2 * N + l1
+    l1 = np.asarray(l1)
+    l2 = np.asarray(l2)
+    N = int(np.max(l1)) + 1
+    M = int(np.max(l2)) + 1
+    if compact and N * M > max(_DENSE_STATES, len(l1)):
+        # Relabel each side first, so the intermediate codes can't overflow.
+        l1 = np.unique(l1, return_inverse=True)[1].astype(np.int64)
+        l2 = np.unique(l2, return_inverse=True)[1].astype(np.int64)
+        codes = l2 * (int(np.max(l1)) + 1) + l1
+        unique, codes = np.unique(codes, return_inverse=True)
+        return codes.astype(np.min_scalar_type(len(unique) - 1))
+
+    dtype = np.min_scalar_type(N * M - 1)
+    if not compact:
+        dtype = np.promote_types(np.result_type(l1, l2), dtype)
+    if dtype.kind not in 'iu':
+        raise OverflowError('joint_dataset: %d joint states do not fit in 64 '
+                            'bits; use compact=True' % (N * M))
+    return l2.astype(dtype) * dtype.type(N) + l1.astype(dtype)
 
 
 def mutual_info(l1, l2):
@@ -70,7 +139,8 @@ def mutual_info(l1, l2):
     :type l2: numpy.array or similar
     :retuns: mutual information, as a float
     """
-    return entropy(l1) + entropy(l2) - entropy(joint_dataset(l1, l2))
+    joint = joint_dataset(l1, l2, compact=True)
+    return entropy(l1) + entropy(l2) - entropy(joint)
 
 
 def mutual_info_fast(l1, l2, l1_entropy, l2_entropy):
@@ -90,7 +160,8 @@ def mutual_info_fast(l1, l2, l1_entropy, l2_entropy):
     :param float l2_entropy: entropy of ``l2`` (precomputed)
     :retuns: mutual information, as a float
     """
-    return l1_entropy + l2_entropy - entropy(joint_dataset(l1, l2))
+    joint = joint_dataset(l1, l2, compact=True)
+    return l1_entropy + l2_entropy - entropy(joint)
 
 
 def synergy(g1, g2, c):
@@ -106,5 +177,1294 @@ def synergy(g1, g2, c):
     :param c: The phenotype
     :return: Bivariate synergy.
     """
-    return mutual_info(joint_dataset(g1, g2), c) -\
+    return mutual_info(joint_dataset(g1, g2, compact=True), c) -\
         mutual_info(g1, c) - mutual_info(g2, c)
+
+
+def _subset_entropies(ls, subsets):
+    """
+    Return the joint entropy of several subsets of some vectors.
+
+    A single joint histogram of every vector is counted, and the histogram
+    of each subset is found by summing out the other vectors.  If that
+    histogram would be too big, each subset's joint is instead built with
+    :func:`joint_dataset` in compact mode.
+
+    :param list ls: Integer vectors of equal length.
+    :param list subsets: Tuples of indices into ``ls``.
+    :return: List of joint entropies, one per subset.
+    """
+    ls = [np.asarray(l) for l in ls]
+    shape = tuple(int(np.max(l)) + 1 for l in ls)
+    size = int(np.prod(shape, dtype=object))
+    if size <= max(_DENSE_STATES, len(ls[0])):
+        codes = np.ravel_multi_index([l.astype(np.intp) for l in ls], shape)
+        counts = np.bincount(codes, minlength=size).reshape(shape)
+        return [entropy_from_counts(counts.sum(axis=tuple(
+            axis for axis in range(len(ls)) if axis not in subset)).ravel())
+            for subset in subsets]
+
+    result = []
+    for subset in subsets:
+        joint = ls[subset[0]]
+        for axis in subset[1:]:
+            joint = joint_dataset(joint, ls[axis], compact=True)
+        result.append(entropy(joint))
+    return result
+
+
+def conditional_mutual_info(x, y, z):
+    """
+    Return the mutual information of x and y, given z.
+
+    This is the information x and y share once z is known:
+
+        :math:`I(X; Y | Z) = H(X,Z) + H(Y,Z) - H(X,Y,Z) - H(Z)`
+
+    All four entropies come from a single joint histogram.
+
+    :param x: first integer vector (X)
+    :param y: second integer vector (Y)
+    :param z: integer vector conditioned on (Z)
+    :returns: conditional mutual information, as a float
+    """
+    h_xz, h_yz, h_xyz, h_z = _subset_entropies(
+        [x, y, z], [(0, 2), (1, 2), (0, 1, 2), (2,)])
+    return h_xz + h_yz - h_xyz - h_z
+
+
+def interaction_info(x, y, z):
+    """
+    Return the interaction information of three vectors.
+
+    This is how much knowing z changes the information shared by x and y:
+
+        :math:`I(X; Y; Z) = I(X; Y | Z) - I(X; Y)`
+
+    It is symmetric in its arguments, positive for synergy and negative for
+    redundancy, and equal to :func:`synergy` (it's the negative of McGill's
+    co-information).  All of the entropies come from a single joint
+    histogram.
+
+    :param x: first integer vector (X)
+    :param y: second integer vector (Y)
+    :param z: third integer vector (Z)
+    :returns: interaction information, as a float
+    """
+    h_x, h_y, h_z, h_xy, h_xz, h_yz, h_xyz = _subset_entropies(
+        [x, y, z], [(0,), (1,), (2,), (0, 1), (0, 2), (1, 2), (0, 1, 2)])
+    return h_xy + h_xz + h_yz - h_x - h_y - h_z - h_xyz
+
+
+def total_correlation(*ls):
+    r"""
+    Return the total correlation (multi-information) of any number of vectors.
+
+    This generalizes mutual information to more than two variables:
+
+        :math:`C(X_1, ..., X_n) = \sum_i H(X_i) - H(X_1, ..., X_n)`
+
+    All of the entropies come from a single joint histogram.
+
+    :param ls: integer vectors
+    :returns: total correlation, as a float
+    """
+    entropies = _subset_entropies(
+        ls, [(i,) for i in range(len(ls))] + [tuple(range(len(ls)))])
+    return sum(entropies[:-1]) - entropies[-1]
+
+
+def _triple_entropies(X, triples):
+    """
+    Return all of the sub-entropies of a batch of feature triples.
+
+    The joint histograms of every triple are counted together (see
+    :func:`_dense_counts`), and the histograms of each subset are sums of
+    those.  If the dense histograms would be too big, each subset is counted
+    sparsely instead (see :func:`_grouped_entropy`), so memory is bounded by
+    the codes, not the ``k**3`` possible states of a triple.
+
+    :param X: Integer array of shape ``(n_samples, N)``.
+    :param triples: Integer array of shape ``(b, 3)`` of column indices.
+    :return: Arrays of the entropies of X, Y, Z, XY, XZ, YZ and XYZ, in that
+      order, for each triple.
+    """
+    b = len(triples)
+    columns = [X[:, triples[:, i]].astype(np.intp) for i in range(3)]
+    shape = [int(column.max()) + 1 for column in columns]
+    counts = _dense_counts(*_offset_codes(columns, shape))
+    if counts is not None:
+        counts = counts.reshape(b, *shape)
+
+        def h(*subset):
+            axes = tuple(1 + i for i in range(3) if i not in subset)
+            return entropy_from_counts(counts.sum(axis=axes).reshape(b, -1))
+    else:
+        def h(*subset):
+            return _grouped_entropy(*_offset_codes(
+                [columns[i] for i in subset], [shape[i] for i in subset]))
+    return (h(0), h(1), h(2), h(0, 1), h(0, 2), h(1, 2), h(0, 1, 2))
+
+
+def _triple_batches(X, triples, block_size):
+    """
+    Yield the sub-entropies of triples, ``block_size`` triples at a time.
+
+    :return: Generator of :func:`_triple_entropies` results.
+    """
+    X = np.asarray(X)
+    triples = np.asarray(triples, dtype=np.intp).reshape(-1, 3)
+    for start in range(0, len(triples), block_size):
+        yield _triple_entropies(X, triples[start:start + block_size])
+
+
+def conditional_mutual_info_batch(X, triples, block_size=4096):
+    """
+    Compute :func:`conditional_mutual_info` for many triples of features.
+
+    Counting is done once per block of triples, with no Python-level loop
+    over triples.  Memory is bounded by roughly ``n_samples * block_size``
+    integers, whatever the number of distinct values of the features.
+
+    :param X: Non-negative integer array of shape ``(n_samples, N)``.  Each
+      column is one feature.
+    :type X: numpy.array or similar
+    :param triples: Array of shape ``(b, 3)``.  Each row holds the column
+      indices of X, Y and Z.
+    :param int block_size: Number of triples counted at once.
+    :returns: Array of ``b`` values of ``I(X; Y | Z)``.
+    """
+    return np.concatenate([
+        h_xz + h_yz - h_xyz - h_z
+        for _, _, h_z, _, h_xz, h_yz, h_xyz
+        in _triple_batches(X, triples, block_size)] or [np.empty(0)])
+
+
+def interaction_info_batch(X, triples, block_size=4096):
+    """
+    Compute :func:`interaction_info` for many triples of features.
+
+    See :func:`conditional_mutual_info_batch`.
+
+    :param X: Non-negative integer array of shape ``(n_samples, N)``.  Each
+      column is one feature.
+    :type X: numpy.array or similar
+    :param triples: Array of shape ``(b, 3)`` of column indices.
+    :param int block_size: Number of triples counted at once.
+    :returns: Array of ``b`` values of ``I(X; Y; Z)``.
+    """
+    return np.concatenate([
+        h_xy + h_xz + h_yz - h_x - h_y - h_z - h_xyz
+        for h_x, h_y, h_z, h_xy, h_xz, h_yz, h_xyz
+        in _triple_batches(X, triples, block_size)] or [np.empty(0)])
+
+
+def total_correlation_batch(X, triples, block_size=4096):
+    """
+    Compute :func:`total_correlation` for many triples of features.
+
+    See :func:`conditional_mutual_info_batch`.
+
+    :param X: Non-negative integer array of shape ``(n_samples, N)``.  Each
+      column is one feature.
+    :type X: numpy.array or similar
+    :param triples: Array of shape ``(b, 3)`` of column indices.
+    :param int block_size: Number of triples counted at once.
+    :returns: Array of ``b`` values of ``C(X, Y, Z)``.
+    """
+    return np.concatenate([
+        h_x + h_y + h_z - h_xyz
+        for h_x, h_y, h_z, _, _, _, h_xyz
+        in _triple_batches(X, triples, block_size)] or [np.empty(0)])
+
+
+def _add_counts(total, counts):
+    """
+    Add two histograms, growing the result to fit whichever is larger.
+
+    :param total: N-dimensional array of counts.
+    :param counts: Array of counts with the same number of dimensions.
+    :return: The summed histogram (may be ``total``, updated in place).
+    """
+    shape = tuple(max(a, b) for a, b in zip(total.shape, counts.shape))
+    if shape != total.shape:
+        grown = np.zeros(shape, dtype=np.int64)
+        grown[tuple(slice(0, k) for k in total.shape)] = total
+        total = grown
+    total[tuple(slice(0, k) for k in counts.shape)] += counts
+    return total
+
+
+def _merge_sparse(values, counts):
+    """
+    Sum the counts of equal values (or rows, for a 2-D array of values).
+
+    :param values: Array of observed values, possibly with repeats.
+    :param counts: Array of the count of each entry of ``values``.
+    :return: ``(values, counts)``, with each distinct value once, in order.
+    """
+    unique, inverse = np.unique(values, axis=0, return_inverse=True)
+    counts = np.bincount(inverse.ravel(), weights=counts,
+                         minlength=len(unique))
+    return unique, counts.astype(np.int64)
+
+
+class EntropyAccumulator(object):
+    """
+    Computes :func:`entropy` incrementally, over chunks of a vector.
+
+    Only the histogram of values seen so far is stored, so the vector never
+    needs to be in memory all at once.  While every value is below
+    ``_DENSE_STATES``, it is a dense array indexed by value.  After that,
+    only the observed values are kept (in :attr:`values`), along with their
+    counts, so memory follows the number of distinct values rather than the
+    largest one.  Accumulators for different parts of the data (e.g. from
+    different workers) may be combined with :meth:`merge`.  The result of
+    :meth:`value` is exactly what :func:`entropy` would return on the
+    concatenation of every chunk.
+    """
+
+    def __init__(self):
+        """
+        **Constructor**
+
+        :return: An empty accumulator.
+        """
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.values = None
+
+    def update(self, chunk):
+        """
+        Add a chunk of the vector.
+
+        :param chunk: Array of non-negative integers/bools.
+        :return: This accumulator.
+        """
+        chunk = np.asarray(chunk)
+        if chunk.size == 0:
+            return self
+        if self.values is None and np.max(chunk) < _DENSE_STATES:
+            self.counts = _add_counts(self.counts, np.bincount(chunk))
+        else:
+            self._add_sparse(*np.unique(chunk, return_counts=True))
+        return self
+
+    def _sparse(self):
+        """
+        Return the observed values and their counts.
+
+        :return: ``(values, counts)`` arrays.
+        """
+        if self.values is not None:
+            return self.values, self.counts
+        values = np.flatnonzero(self.counts)
+        return values, self.counts[values]
+
+    def _add_sparse(self, values, counts):
+        """
+        Add counts of observed values, switching to sparse storage.
+
+        :param values: Array of distinct values.
+        :param counts: Array of their counts.
+        :return: None
+        """
+        old_values, old_counts = self._sparse()
+        self.values, self.counts = _merge_sparse(
+            np.concatenate([old_values, values]),
+            np.concatenate([old_counts, counts]))
+
+    def merge(self, other):
+        """
+        Add the counts of another accumulator to this one.
+
+        :param EntropyAccumulator other: The accumulator to merge in.
+        :return: This accumulator.
+        """
+        if self.values is None and other.values is None:
+            self.counts = _add_counts(self.counts, other.counts)
+        else:
+            self._add_sparse(*other._sparse())
+        return self
+
+    def value(self):
+        """
+        Return the entropy of all data accumulated so far.
+
+        :return: The entropy, as a float.
+        """
+        if self.values is not None:
+            return entropy_from_counts(self.counts)
+        return entropy_from_counts(np.trim_zeros(self.counts, 'b'))
+
+
+class MutualInfoAccumulator(object):
+    """
+    Computes :func:`mutual_info` incrementally, over chunks of two vectors.
+
+    Only the joint histogram of the values seen so far is stored (the
+    marginal histograms are its sums).  As with :class:`EntropyAccumulator`,
+    it is dense while the joint state space is within ``_DENSE_STATES``, and
+    after that only the observed ``(x, y)`` pairs (in :attr:`values`) and
+    their counts are kept.  The result of :meth:`value` is exactly what
+    :func:`mutual_info` would return on the concatenation of every chunk.
+    """
+
+    def __init__(self):
+        """
+        **Constructor**
+
+        :return: An empty accumulator.
+        """
+        self.counts = np.zeros((0, 0), dtype=np.int64)
+        self.values = None
+
+    def update(self, l1, l2):
+        """
+        Add a chunk of each vector.
+
+        :param l1: Chunk of the first integer vector (X).
+        :param l2: Chunk of the second integer vector (Y), of the same length.
+        :return: This accumulator.
+        """
+        l1 = np.asarray(l1, dtype=np.intp)
+        l2 = np.asarray(l2, dtype=np.intp)
+        if len(l1) == 0:
+            return self
+        if self.values is None:
+            N = max(int(np.max(l1)) + 1, self.counts.shape[1])
+            M = max(int(np.max(l2)) + 1, self.counts.shape[0])
+            if N * M <= _DENSE_STATES:
+                counts = np.bincount(l2 * N + l1,
+                                     minlength=N * M).reshape(M, N)
+                self.counts = _add_counts(self.counts, counts)
+                return self
+        self._add_sparse(*np.unique(np.stack([l1, l2], axis=1), axis=0,
+                                    return_counts=True))
+        return self
+
+    def _sparse(self):
+        """
+        Return the observed ``(x, y)`` pairs and their counts.
+
+        :return: ``(values, counts)``, where ``values`` has shape ``(k, 2)``.
+        """
+        if self.values is not None:
+            return self.values, self.counts
+        y, x = np.nonzero(self.counts)
+        return np.stack([x, y], axis=1), self.counts[y, x]
+
+    def _add_sparse(self, values, counts):
+        """
+        Add counts of observed pairs, switching to sparse storage.
+
+        :param values: Array of distinct ``(x, y)`` pairs.
+        :param counts: Array of their counts.
+        :return: None
+        """
+        old_values, old_counts = self._sparse()
+        self.values, self.counts = _merge_sparse(
+            np.concatenate([old_values, values]),
+            np.concatenate([old_counts, counts]))
+
+    def merge(self, other):
+        """
+        Add the counts of another accumulator to this one.
+
+        :param MutualInfoAccumulator other: The accumulator to merge in.
+        :return: This accumulator.
+        """
+        if self.values is None and other.values is None:
+            M, N = np.maximum(self.counts.shape, other.counts.shape)
+            if M * N <= _DENSE_STATES:
+                self.counts = _add_counts(self.counts, other.counts)
+                return self
+        self._add_sparse(*other._sparse())
+        return self
+
+    def value(self):
+        """
+        Return the mutual information of all data accumulated so far.
+
+        :return: The mutual information, as a float.
+        """
+        if self.values is not None:
+            l1_counts, l2_counts = (
+                np.bincount(np.unique(self.values[:, i],
+                                      return_inverse=True)[1],
+                            weights=self.counts)
+                for i in range(2))
+            return (entropy_from_counts(l1_counts) +
+                    entropy_from_counts(l2_counts) -
+                    entropy_from_counts(self.counts))
+        l1_counts = np.trim_zeros(self.counts.sum(axis=0), 'b')
+        l2_counts = np.trim_zeros(self.counts.sum(axis=1), 'b')
+        joint = self.counts[:len(l2_counts), :len(l1_counts)]
+        return (entropy_from_counts(l1_counts) +
+                entropy_from_counts(l2_counts) -
+                entropy_from_counts(np.trim_zeros(joint.ravel(), 'b')))
+
+
+def _relabel(codes):
+    """
+    Relabel codes to ``[0, K)``, where K is the number of distinct codes.
+
+    :param codes: Integer vector.
+    :return: ``(K, relabeled)``.
+    """
+    unique, inverse = np.unique(codes, return_inverse=True)
+    return len(unique), inverse.astype(np.intp).ravel()
+
+
+class InformationIndex(object):
+    """
+    A discretized feature matrix with cached histograms, for repeated queries.
+
+    Like :func:`mutual_info_fast`, this exists to avoid recomputing the same
+    things over and over, but without making the caller keep track of them.
+    When the index is built, each feature is stored as a contiguous row of
+    the smallest unsigned dtype that fits (usually ``uint8``), along with its
+    cardinality, histogram and entropy.  Queries then never need to call
+    ``np.max`` or recount a marginal.  Joint histograms are cached as well,
+    with the least recently used ones evicted once there are more than
+    ``cache_size`` of them.
+
+    Features are referred to by their column index in the original matrix.
+    To ask about a phenotype, include it as a column.
+    """
+
+    def __init__(self, X, cache_size=1024):
+        """
+        **Constructor**
+
+        :param X: Non-negative integer array of shape ``(n_samples, N)``.
+          Each column is one feature.
+        :type X: numpy.array or similar
+        :param int cache_size: Maximum number of joint histograms to cache.
+        :return: None
+        """
+        X = np.asarray(X)
+        self.cardinality = X.max(axis=0).astype(np.intp) + 1
+        dtype = np.min_scalar_type(int(self.cardinality.max()) - 1)
+        self.codes = np.ascontiguousarray(X.T, dtype=dtype)
+        self.counts = [np.bincount(row, minlength=k)
+                       for row, k in zip(self.codes, self.cardinality)]
+        self.entropies = np.array([entropy_from_counts(counts)
+                                   for counts in self.counts])
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        """Return the number of features in the index."""
+        return len(self.codes)
+
+    def _histogram(self, key):
+        """
+        Return the (cached) joint histogram of some features.
+
+        If the features have more joint states than ``_DENSE_STATES`` (and
+        the number of samples), only the observed states are counted, with
+        :func:`numpy.unique`, so memory follows the samples.  The codes are
+        then relabeled to the observed states as they are built up, so that
+        they can't overflow either.
+
+        :param tuple key: Feature indices, sorted.
+        :return: ``(dense, counts)``: if ``dense``, an array of counts with one
+          axis per feature, and otherwise a 1-D array of the counts of the
+          observed states.
+        """
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        n = self.codes.shape[1]
+        shape = tuple(int(self.cardinality[feature]) for feature in key)
+        states = 1
+        for k in shape:
+            states *= k
+        codes = np.zeros(n, dtype=np.intp)
+        if states <= max(_DENSE_STATES, n):
+            for feature, k in zip(key, shape):
+                codes *= k
+                codes += self.codes[feature]
+            histogram = True, np.bincount(codes, minlength=states).reshape(
+                shape)
+        else:
+            width = 1
+            for feature, k in zip(key, shape):
+                row = self.codes[feature]
+                if k > n:
+                    k, row = _relabel(row)
+                if width * k > max(_DENSE_STATES, n):
+                    width, codes = _relabel(codes)
+                codes = codes * k + row
+                width *= k
+            histogram = False, np.unique(codes, return_counts=True)[1]
+        self._cache[key] = histogram
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return histogram
+
+    def joint_counts(self, *features):
+        """
+        Return the joint histogram of some features.
+
+        :param features: Feature indices.
+        :return: Array of counts with one axis per feature, in the order
+          given.  This may be a view of a cached array, so don't modify it.
+        :raises ValueError: If the features have too many joint states for a
+          dense histogram (:func:`joint_entropy` still works then).
+        """
+        dense, counts = self._histogram(tuple(sorted(features)))
+        if not dense:
+            raise ValueError('InformationIndex.joint_counts: too many joint '
+                             'states for a dense histogram')
+        order = sorted(range(len(features)), key=lambda k: features[k])
+        return np.transpose(counts, np.argsort(order))
+
+    def entropy(self, i):
+        """
+        Return the entropy of a feature (see :func:`entropy`).
+
+        :param int i: Feature index.
+        :return: The (precomputed) entropy of the feature.
+        """
+        return self.entropies[i]
+
+    def joint_entropy(self, *features):
+        """
+        Return the joint entropy of some features.
+
+        :param features: Feature indices.
+        :return: The joint entropy, as a float.
+        """
+        _, counts = self._histogram(tuple(sorted(features)))
+        return entropy_from_counts(counts.ravel())
+
+    def mutual_info(self, i, j):
+        """
+        Return the mutual information of two features (see
+        :func:`mutual_info`).
+
+        :param int i: First feature index (X).
+        :param int j: Second feature index (Y).
+        :return: Mutual information, as a float.
+        """
+        return self.entropies[i] + self.entropies[j] - self.joint_entropy(i, j)
+
+    def conditional_entropy(self, i, j):
+        """
+        Return the entropy of one feature given another.
+
+            :math:`H(X|Y) = H(X,Y) - H(Y)`
+
+        :param int i: Feature index (X).
+        :param int j: Index of the feature conditioned on (Y).
+        :return: Conditional entropy, as a float.
+        """
+        return self.joint_entropy(i, j) - self.entropies[j]
+
+    def synergy(self, i, j, c):
+        """
+        Return the synergy of two features WRT a phenotype (see
+        :func:`synergy`).
+
+        :param int i: The first factor's index.
+        :param int j: The second factor's index.
+        :param int c: The phenotype's index.
+        :return: Bivariate synergy.
+        """
+        return (self.joint_entropy(i, j) - self.joint_entropy(i, j, c) +
+                self.joint_entropy(i, c) + self.joint_entropy(j, c) -
+                self.entropies[i] - self.entropies[j] - self.entropies[c])
+
+
+def _tiles(n, block_size):
+    """
+    Yield the upper-triangular tiles of an ``n`` by ``n`` pair space.
+
+    :param int n: Number of features.
+    :param int block_size: Width and height of each tile.
+    :return: Generator of ``(rows, cols)`` slice pairs, with
+      ``rows.start <= cols.start``.
+    """
+    for r in range(0, n, block_size):
+        for c in range(r, n, block_size):
+            yield (slice(r, min(r + block_size, n)),
+                   slice(c, min(c + block_size, n)))
+
+
+# Arrays shared with the current worker process by _attach().
+_shared = None
+
+
+def _attach(paths):
+    """
+    Pool initializer: memory-map the shared arrays into this worker.
+
+    :param list paths: Paths of ``.npy`` files, in argument order.
+    """
+    global _shared
+    _shared = [np.load(path, mmap_mode='r') for path in paths]
+
+
+def _call_shared(func, tile):
+    """
+    Run a tile function in a worker, against the shared arrays.
+
+    :param func: Tile function, taking the shared arrays and then the tile.
+    :param tuple tile: A ``(rows, cols)`` pair from :func:`_tiles`.
+    :return: Return value of ``func``.
+    """
+    return func(*_shared, *tile)
+
+
+def _map_tiles(func, arrays, n, block_size, nproc=1):
+    """
+    Apply a tile function to every tile of the pair space, in order.
+
+    In serial, this simply calls ``func(*arrays, rows, cols)`` for each tile.
+    Otherwise, the arrays are written once to memory-mapped ``.npy`` files,
+    which every worker of a process pool maps read-only, so that only the
+    (tiny) tile slices and the results are pickled.  Since each tile is
+    computed by the same code either way, and results come back in tile
+    order, the parallel results are identical to the serial ones.
+
+    :param func: Tile function (must be defined at module level).
+    :param list arrays: Arrays passed as the first arguments of ``func``.
+    :param int n: Number of features.
+    :param int block_size: Width and height of each tile.
+    :param int nproc: Number of processes.  1 means serial, None means
+      :func:`multiprocessing.cpu_count`.
+    :return: Generator of ``(tile, result)`` pairs.
+    """
+    tiles = list(_tiles(n, block_size))
+    if nproc == 1:
+        for tile in tiles:
+            yield tile, func(*arrays, *tile)
+        return
+
+    nproc = nproc or mp.cpu_count()
+    directory = tempfile.mkdtemp(prefix='smbio-')
+    try:
+        paths = []
+        for index, array in enumerate(arrays):
+            paths.append(os.path.join(directory, '%d.npy' % index))
+            np.save(paths[-1], array)
+        chunksize = max(1, len(tiles) // (16 * nproc))
+        with mp.Pool(nproc, initializer=_attach, initargs=(paths,)) as pool:
+            yield from zip(tiles, pool.imap(functools.partial(
+                _call_shared, func), tiles, chunksize=chunksize))
+    finally:
+        shutil.rmtree(directory)
+
+
+def _dense_counts(codes, width):
+    """
+    Count the histogram of each of several variables, if that is cheap.
+
+    Column ``g`` of ``codes`` holds variable ``g``, shifted into the range
+    ``[g * width, (g + 1) * width)``.  The histograms of every column are
+    counted with one :func:`numpy.bincount`, but only if together they take
+    no more memory than the codes themselves (or than ``_DENSE_STATES``).
+
+    :param codes: Integer array of shape ``(n_samples, groups)``.
+    :param int width: Number of possible codes per variable.
+    :return: Array of counts of shape ``(groups, width)``, or None.
+    """
+    groups = codes.shape[1]
+    if groups * width > max(_DENSE_STATES, codes.size):
+        return None
+    counts = np.bincount(codes.ravel(), minlength=groups * width)
+    return counts.reshape(groups, width)
+
+
+def _grouped_entropy(codes, width):
+    """
+    Return the entropy of each of several variables, encoded in one array.
+
+    The variables are encoded as for :func:`_dense_counts`.  If their dense
+    histograms would be too big, only the observed codes are counted, with
+    :func:`numpy.unique`, so memory never grows with ``width``.
+
+    :param codes: Integer array of shape ``(n_samples, groups)``.
+    :param int width: Number of possible codes per variable.
+    :return: Array of ``groups`` entropies.
+    """
+    counts = _dense_counts(codes, width)
+    if counts is not None:
+        return entropy_from_counts(counts)
+    # H = log2(n) - sum(c * log2(c)) / n, over the counts c of each group.
+    n, groups = codes.shape
+    unique, counts = np.unique(codes, return_counts=True)
+    weights = counts * np.log2(counts)
+    total = np.bincount(unique // width, weights=weights, minlength=groups)
+    return np.log2(n) - total / n
+
+
+def _offset_codes(columns, shape):
+    """
+    Encode several variables jointly, shifting each group into its own range.
+
+    :param list columns: Integer arrays of shape ``(n_samples, groups)``,
+      one per variable.
+    :param tuple shape: Number of codes of each variable.
+    :return: ``(codes, width)``, as taken by :func:`_grouped_entropy`.
+    """
+    codes = np.zeros(columns[0].shape, dtype=np.intp)
+    width = 1
+    for column, k in zip(columns, shape):
+        codes *= k
+        codes += column
+        width *= k
+    codes += np.arange(codes.shape[1], dtype=np.intp) * width
+    return codes, width
+
+
+def _joint_codes_tile(A, B, c=None):
+    """
+    Encode the joint of every column of A with every column of B.
+
+    All of the ``a * b`` joint vectors are encoded at once, each shifted into
+    its own range of codes, so that every joint histogram in the tile is
+    counted in one go (see :func:`_grouped_entropy`).  If ``c`` is given,
+    each pair is additionally joined with it, as the fastest-varying part of
+    the code.
+
+    :param A: Integer array of shape ``(n_samples, a)``.
+    :param B: Integer array of shape ``(n_samples, b)``.
+    :param c: Optional integer vector of length ``n_samples``.
+    :return: ``(codes, width)``, where ``codes`` has shape ``(n_samples,
+      a * b)`` and ``width`` is the number of codes per pair.
+    """
+    n, a, b = A.shape[0], A.shape[1], B.shape[1]
+    ka = int(A.max()) + 1
+    kb = int(B.max()) + 1
+    codes = A.astype(np.intp)[:, :, None] * kb + B.astype(np.intp)[:, None, :]
+    if c is None:
+        kc = 1
+    else:
+        kc = int(np.max(c)) + 1
+        codes *= kc
+        codes += np.asarray(c, dtype=np.intp)[:, None, None]
+    width = ka * kb * kc
+    codes += (np.arange(a * b, dtype=np.intp) * width).reshape(a, b)
+    return codes.reshape(n, a * b), width
+
+
+def _joint_entropy_tile(A, B):
+    """
+    Compute the joint entropy of every column of A with every column of B.
+
+    :param A: Integer array of shape ``(n_samples, a)``.
+    :param B: Integer array of shape ``(n_samples, b)``.
+    :return: Array of shape ``(a, b)`` of joint entropies.
+    """
+    return _grouped_entropy(*_joint_codes_tile(A, B)).reshape(A.shape[1],
+                                                               B.shape[1])
+
+
+def _symmetric_tile(tile, rows, cols, diagonal):
+    """
+    Make a diagonal tile exactly symmetric, and give it an exact diagonal.
+
+    Entries ``[i, j]`` and ``[j, i]`` of a diagonal tile are counted in a
+    different order, so they may differ in the last bit.  This copies the
+    upper triangle onto the lower one.
+
+    :param tile: A tile of a symmetric pair matrix.
+    :param slice rows: Features along the first axis of the tile.
+    :param slice cols: Features along the second axis of the tile.
+    :param diagonal: Values for the diagonal (used only if rows == cols).
+    :return: The fixed tile (the same tile, if it is not diagonal).
+    """
+    if rows == cols:
+        tile = np.triu(tile, 1)
+        tile += tile.T
+        tile[np.diag_indices_from(tile)] = diagonal
+    return tile
+
+
+def _mi_tile(X, h, rows, cols):
+    """
+    Compute one tile of the mutual information matrix.
+
+    :param X: Integer array of shape ``(n_samples, n_features)``.
+    :param h: Marginal entropy of each feature.
+    :param slice rows: Features along the first axis of the tile.
+    :param slice cols: Features along the second axis of the tile.
+    :return: Array of mutual information values for the tile.
+    """
+    tile = h[rows, None] + h[None, cols] - _joint_entropy_tile(X[:, rows],
+                                                               X[:, cols])
+    return _symmetric_tile(tile, rows, cols, h[rows])
+
+
+def mutual_info_matrix(X, block_size=64, nproc=1):
+    """
+    Compute the mutual information between every pair of columns of X.
+
+    This is equivalent to calling :func:`mutual_info` on every pair of
+    columns, but far faster for many features.  Each marginal entropy is
+    computed only once, and the joint histograms are counted a tile of
+    ``block_size`` by ``block_size`` pairs at a time, with no Python-level
+    loop over pairs.  Memory used for counting is bounded by roughly
+    ``n_samples * block_size**2`` integers, regardless of the number of
+    features (the returned matrix itself is, of course, ``N`` by ``N``).
+    The histograms are only counted densely while they fit in that bound;
+    for high-cardinality features, where the ``block_size**2 * ka * kb``
+    possible joint states would not, only the observed states are counted
+    (see :func:`_grouped_entropy`).
+
+    If every value in X is 0 or 1, the columns are bit-packed (see
+    :func:`packbits`) and the joint histograms are derived from popcounts,
+    which is much faster and uses an eighth of the memory of ``uint8``.
+
+    :param X: Non-negative integer array of shape ``(n_samples, N)``.  Each
+      column is one feature.
+    :type X: numpy.array or similar
+    :param int block_size: Number of features per side of each tile.
+    :param int nproc: Number of processes to spread the tiles over.  The
+      default, 1, runs in serial.  None uses every core.  The result does not
+      depend on this.
+    :returns: Symmetric ``N`` by ``N`` array, where entry ``[i, j]`` is the
+      mutual information between columns ``i`` and ``j``.  The diagonal holds
+      the entropy of each column.
+    """
+    X = np.asarray(X)
+    n = X.shape[1]
+    if _is_binary(X):
+        P = packbits(X)
+        n_samples = X.shape[0]
+        h = entropy_from_counts(_pair_cells(n_samples, _popcount(P), 0, 0))
+        func, arrays = _mi_packed_tile, [P, np.array(n_samples), h]
+    else:
+        h = np.array([entropy(X[:, i]) for i in range(n)])
+        func, arrays = _mi_tile, [X, h]
+    M = np.empty((n, n))
+    for (rows, cols), tile in _map_tiles(func, arrays, n, block_size, nproc):
+        M[rows, cols] = tile
+        M[cols, rows] = tile.T
+    return M
+
+
+def _synergy_tile(G, c, h_c, mi_c, rows, cols):
+    """
+    Compute one tile of the synergy matrix.
+
+    The pair histograms are obtained by summing the (pair, phenotype)
+    histograms over the phenotype (or, when they are counted sparsely, by
+    dividing the phenotype out of the codes), so each tile is encoded once.
+
+    :param G: Integer array of shape ``(n_samples, n_features)``.
+    :param c: The phenotype.
+    :param float h_c: Entropy of the phenotype.
+    :param mi_c: Mutual information of each feature with the phenotype.
+    :param slice rows: Features along the first axis of the tile.
+    :param slice cols: Features along the second axis of the tile.
+    :return: Array of synergy values for the tile.
+    """
+    shape = (rows.stop - rows.start, cols.stop - cols.start)
+    codes, width = _joint_codes_tile(G[:, rows], G[:, cols], c)
+    kc = int(np.max(c)) + 1
+    counts = _dense_counts(codes, width)
+    if counts is not None:
+        counts = counts.reshape(len(counts), -1, kc)
+        h_pair = entropy_from_counts(counts.sum(axis=2)).reshape(shape)
+        h_all = entropy_from_counts(counts.reshape(len(counts), -1))
+    else:
+        h_pair = _grouped_entropy(codes // kc, width // kc).reshape(shape)
+        h_all = _grouped_entropy(codes, width)
+    h_all = h_all.reshape(shape)
+    tile = h_pair + h_c - h_all - mi_c[rows, None] - mi_c[None, cols]
+    return _symmetric_tile(tile, rows, cols, -mi_c[rows])
+
+
+def _top_pairs(tile, rows, cols, k):
+    """
+    Return the (at most) k largest strictly upper-triangular entries of a tile.
+
+    :param tile: A tile of a symmetric pair matrix.
+    :param slice rows: Features along the first axis of the tile.
+    :param slice cols: Features along the second axis of the tile.
+    :param int k: Number of entries to keep.
+    :return: List of ``(value, i, j)`` tuples, in no particular order.
+    """
+    mask = np.ones(tile.shape, dtype=bool)
+    if rows == cols:
+        mask = np.triu(mask, 1)
+    i, j = np.nonzero(mask)
+    values = tile[i, j]
+    if len(values) > k:
+        keep = np.argpartition(values, -k)[-k:]
+        i, j, values = i[keep], j[keep], values[keep]
+    return [(float(v), int(a) + rows.start, int(b) + cols.start)
+            for v, a, b in zip(values, i, j)]
+
+
+def _top_tile(func, *args, k):
+    """
+    Return only the top k pairs of a tile (see :func:`_top_pairs`).
+
+    :param func: Tile function.
+    :param args: Arguments to ``func``, ending with ``rows`` and ``cols``.
+    :param int k: Number of entries to keep.
+    :return: List of ``(value, i, j)`` tuples.
+    """
+    return _top_pairs(func(*args), args[-2], args[-1], k)
+
+
+def synergy_matrix(G, c, block_size=64, top_k=None, nproc=1):
+    """
+    Compute the synergy of every pair of columns of G with respect to c.
+
+    This is equivalent to calling :func:`synergy` on every pair of columns,
+    but the mutual information of each factor with the phenotype is computed
+    only once, and the pair and (pair, phenotype) histograms are counted a
+    tile at a time (see :func:`mutual_info_matrix`), without rebuilding the
+    joint datasets for every pair.  As with :func:`mutual_info_matrix`,
+    binary factors and phenotypes take a bit-packed fast path.
+
+    If ``top_k`` is given, the full matrix is never stored.  Instead, a
+    bounded heap keeps the ``top_k`` most synergistic pairs seen so far, so
+    memory stays proportional to ``top_k`` rather than ``N**2``.
+
+    :param G: Non-negative integer array of shape ``(n_samples, N)``.  Each
+      column is one factor.
+    :type G: numpy.array or similar
+    :param c: The phenotype (non-negative integer vector of length
+      ``n_samples``).
+    :type c: numpy.array or similar
+    :param int block_size: Number of factors per side of each tile.
+    :param int top_k: If given, only return the ``top_k`` largest synergies.
+    :param int nproc: Number of processes to spread the tiles over (see
+      :func:`mutual_info_matrix`).
+    :returns: If ``top_k`` is None, a symmetric ``N`` by ``N`` array of
+      synergies (the diagonal holds :func:`synergy` of a factor with itself,
+      which is ``-I(G; C)``).  Otherwise, a list of ``(i, j, synergy)``
+      tuples with ``i < j``, sorted from highest synergy to lowest.
+    """
+    G = np.asarray(G)
+    c = np.asarray(c)
+    n = G.shape[1]
+    h_c = entropy(c)
+    if _is_binary(G) and _is_binary(c):
+        P, pc = packbits(G), packbits(c)
+        n_samples = len(c)
+        n_g, n_c = _popcount(P), _popcount(pc)
+        h = entropy_from_counts(_pair_cells(n_samples, n_g, 0, 0))
+        h_gc = entropy_from_counts(_pair_cells(n_samples, n_g, n_c,
+                                               _popcount(P & pc)))
+        mi_c = h + h_c - h_gc
+        func = _synergy_packed_tile
+        arrays = [P, pc, np.array(n_samples), h_c, mi_c]
+    else:
+        mi_c = np.array([mutual_info_fast(G[:, i], c, entropy(G[:, i]), h_c)
+                         for i in range(n)])
+        func = _synergy_tile
+        arrays = [G, c, h_c, mi_c]
+    if top_k is None:
+        S = np.empty((n, n))
+        for (rows, cols), tile in _map_tiles(func, arrays, n, block_size,
+                                             nproc):
+            S[rows, cols] = tile
+            S[cols, rows] = tile.T
+        return S
+
+    if top_k < 1:
+        raise ValueError('synergy_matrix: top_k must be at least 1')
+    heap = []
+    func = functools.partial(_top_tile, func, k=top_k)
+    for _, items in _map_tiles(func, arrays, n, block_size, nproc):
+        for item in items:
+            if len(heap) < top_k:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+    return [(i, j, v) for v, i, j in sorted(heap, reverse=True)]
+
+
+# Number of set bits in each possible byte, for NumPy without bitwise_count.
+_POPCOUNT_TABLE = np.array([bin(b).count('1') for b in range(256)],
+                           dtype=np.uint8)
+
+
+def _popcount(words):
+    """
+    Count the set bits in packed words, along the last axis.
+
+    :param words: Array of ``uint64`` words (see :func:`packbits`).
+    :return: Integer array with the last axis summed away.
+    """
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+    octets = np.ascontiguousarray(words).view(np.uint8)
+    return _POPCOUNT_TABLE[octets].sum(axis=-1, dtype=np.int64)
+
+
+def _is_binary(l):
+    """Return True if an array only holds the values 0 and 1."""
+    return l.dtype == bool or (l.size > 0 and np.max(l) <= 1)
+
+
+def _pair_cells(n, n_x, n_y, n_xy):
+    """
+    Build the joint histogram of two binary variables from popcounts.
+
+    :param n: Number of samples.
+    :param n_x: Number of samples where X is 1.
+    :param n_y: Number of samples where Y is 1.
+    :param n_xy: Number of samples where both are 1.
+    :return: Counts of (0, 0), (1, 0), (0, 1), (1, 1), stacked on the last
+      axis.
+    """
+    n_xy = np.asarray(n_xy)
+    return np.stack(np.broadcast_arrays(n - n_x - n_y + n_xy, n_x - n_xy,
+                                        n_y - n_xy, n_xy), axis=-1)
+
+
+def packbits(X):
+    """
+    Pack binary vectors into 64-bit words, 64 samples per word.
+
+    This is the representation used by the bit-packed paths of
+    :func:`mutual_info_packed`, :func:`synergy_packed`,
+    :func:`mutual_info_matrix` and :func:`synergy_matrix`.  Trailing bits of
+    the last word are zero.
+
+    :param X: Binary vector of length ``n_samples``, or binary array of shape
+      ``(n_samples, N)`` with one feature per column.
+    :type X: numpy.array or similar
+    :returns: ``uint64`` array of shape ``(n_words,)`` for a vector, or
+      ``(N, n_words)`` for an array (one row per feature).
+    """
+    X = np.asarray(X, dtype=bool)
+    packed = np.packbits(X.T, axis=-1)
+    padding = [(0, 0)] * (packed.ndim - 1) + [(0, -packed.shape[-1] % 8)]
+    return np.ascontiguousarray(np.pad(packed, padding)).view(np.uint64)
+
+
+def mutual_info_packed(p1, p2, n_samples):
+    """
+    Return the mutual information of two bit-packed binary vectors.
+
+    The whole joint histogram is derived from three popcounts: of each
+    vector, and of their AND.  See :func:`mutual_info`.
+
+    :param p1: first packed vector (X), from :func:`packbits`
+    :param p2: second packed vector (Y), from :func:`packbits`
+    :param int n_samples: length of the original vectors
+    :returns: mutual information, as a float
+    """
+    n_x, n_y = _popcount(p1), _popcount(p2)
+    return (entropy_from_counts(_pair_cells(n_samples, n_x, 0, 0)) +
+            entropy_from_counts(_pair_cells(n_samples, n_y, 0, 0)) -
+            entropy_from_counts(_pair_cells(n_samples, n_x, n_y,
+                                            _popcount(p1 & p2))))
+
+
+def _triple_cells(n, n_x, n_y, n_xy, n_c, n_xc, n_yc, n_xyc):
+    """
+    Build the joint histogram of three binary variables from popcounts.
+
+    :return: Counts of each (X, Y) combination with C = 0, then with C = 1,
+      stacked on the last axis.
+    """
+    return np.concatenate([
+        _pair_cells(n - n_c, n_x - n_xc, n_y - n_yc, n_xy - n_xyc),
+        _pair_cells(n_c, n_xc, n_yc, n_xyc)], axis=-1)
+
+
+def synergy_packed(p1, p2, pc, n_samples):
+    """
+    Return the synergy of two bit-packed binary factors WRT a binary phenotype.
+
+    See :func:`synergy` and :func:`mutual_info_packed`.
+
+    :param p1: The first packed factor.
+    :param p2: The second packed factor.
+    :param pc: The packed phenotype.
+    :param int n_samples: length of the original vectors
+    :return: Bivariate synergy.
+    """
+    n = n_samples
+    n_1, n_2, n_c = _popcount(p1), _popcount(p2), _popcount(pc)
+    n_12, n_12c = _popcount(p1 & p2), _popcount(p1 & p2 & pc)
+    n_1c, n_2c = _popcount(p1 & pc), _popcount(p2 & pc)
+    return (entropy_from_counts(_pair_cells(n, n_1, n_2, n_12)) -
+            entropy_from_counts(_triple_cells(n, n_1, n_2, n_12, n_c, n_1c,
+                                              n_2c, n_12c)) +
+            entropy_from_counts(_pair_cells(n, n_1, n_c, n_1c)) +
+            entropy_from_counts(_pair_cells(n, n_2, n_c, n_2c)) -
+            entropy_from_counts(_pair_cells(n, n_1, 0, 0)) -
+            entropy_from_counts(_pair_cells(n, n_2, 0, 0)) -
+            entropy_from_counts(_pair_cells(n, n_c, 0, 0)))
+
+
+def _mi_packed_tile(P, n, h, rows, cols):
+    """
+    Compute one tile of the mutual information matrix from packed features.
+
+    :param P: Packed features, one per row (see :func:`packbits`).
+    :param n: Number of samples.
+    :param h: Marginal entropy of each feature.
+    :param slice rows: Features along the first axis of the tile.
+    :param slice cols: Features along the second axis of the tile.
+    :return: Array of mutual information values for the tile.
+    """
+    A, B = P[rows], P[cols]
+    n_xy = _popcount(A[:, None, :] & B[None, :, :])
+    cells = _pair_cells(n, _popcount(A)[:, None], _popcount(B)[None, :], n_xy)
+    tile = h[rows, None] + h[None, cols] - entropy_from_counts(cells)
+    return _symmetric_tile(tile, rows, cols, h[rows])
+
+
+def _synergy_packed_tile(P, pc, n, h_c, mi_c, rows, cols):
+    """
+    Compute one tile of the synergy matrix from packed factors.
+
+    :param P: Packed factors, one per row (see :func:`packbits`).
+    :param pc: Packed phenotype.
+    :param n: Number of samples.
+    :param float h_c: Entropy of the phenotype.
+    :param mi_c: Mutual information of each factor with the phenotype.
+    :param slice rows: Factors along the first axis of the tile.
+    :param slice cols: Factors along the second axis of the tile.
+    :return: Array of synergy values for the tile.
+    """
+    A, B = P[rows], P[cols]
+    Ac, Bc = A & pc, B & pc
+    n_x, n_y = _popcount(A)[:, None], _popcount(B)[None, :]
+    n_xc, n_yc = _popcount(Ac)[:, None], _popcount(Bc)[None, :]
+    n_xy = _popcount(A[:, None, :] & B[None, :, :])
+    n_xyc = _popcount(Ac[:, None, :] & B[None, :, :])
+    h_pair = entropy_from_counts(_pair_cells(n, n_x, n_y, n_xy))
+    h_all = entropy_from_counts(_triple_cells(n, n_x, n_y, n_xy, _popcount(pc),
+                                              n_xc, n_yc, n_xyc))
+    tile = h_pair + h_c - h_all - mi_c[rows, None] - mi_c[None, cols]
+    return _symmetric_tile(tile, rows, cols, -mi_c[rows])
+
+
+PermutationTest = namedtuple('PermutationTest',
+                             ['statistic', 'p_value', 'n_permutations'])
+PermutationTest.__doc__ = """
+Result of a permutation test: the observed ``statistic``, its (one-sided)
+``p_value``, and the number of permutations actually drawn.
+"""
+
+# Number of standard errors the running p-value estimate must be from alpha
+# before a permutation test stops early (about 99.9% confidence).
+_EARLY_STOP_Z = 3.29
+
+
+def _batch_joint_entropy(x, Y):
+    """
+    Return the joint entropy of a vector with each row of a 2-D array.
+
+    The joints are counted together as in :func:`_grouped_entropy`, so a
+    large number of possible states is counted sparsely.
+
+    :param x: Integer vector of length ``n_samples``.
+    :param Y: Integer array of shape ``(b, n_samples)``.
+    :return: Array of ``b`` joint entropies.
+    """
+    Y = Y.T.astype(np.intp)
+    X = np.broadcast_to(np.asarray(x, dtype=np.intp)[:, None], Y.shape)
+    shape = (int(np.max(Y)) + 1, int(np.max(x)) + 1)
+    return _grouped_entropy(*_offset_codes([Y, X], shape))
+
+
+def _permutation_test(statistic, c, n_permutations, alpha, batch_size, seed,
+                      early_stop):
+    """
+    Run a permutation test of a statistic that is vectorized over shuffles.
+
+    :param statistic: Function taking a ``(b, n_samples)`` array of
+      phenotypes and returning ``b`` statistics.
+    :param c: The phenotype that is shuffled.
+    :return: A :class:`PermutationTest`.
+    """
+    c = np.asarray(c)
+    rng = np.random.default_rng(seed)
+    observed = statistic(c[None, :])[0]
+    exceeded = done = 0
+    while done < n_permutations:
+        count = min(batch_size, n_permutations - done)
+        shuffles = rng.permuted(np.tile(c, (count, 1)), axis=1)
+        exceeded += int(np.sum(statistic(shuffles) >= observed))
+        done += count
+        error = np.sqrt(alpha * (1 - alpha) / done)
+        if early_stop and abs(exceeded / done - alpha) > _EARLY_STOP_Z * error:
+            break
+    return PermutationTest(observed, (exceeded + 1) / (done + 1), done)
+
+
+def mutual_info_permutation_test(l1, l2, n_permutations=1000, alpha=0.05,
+                                 batch_size=100, seed=None, early_stop=True):
+    """
+    Test whether mutual information is significant, by shuffling l2.
+
+    The null distribution is the mutual information of l1 with shuffled
+    copies of l2.  Shuffles are drawn ``batch_size`` at a time as the rows of
+    one 2-D array, and all of their joint histograms are counted together,
+    with a single :func:`numpy.bincount` or, for very many possible states,
+    :func:`numpy.unique` (the marginal entropies never change, so they are
+    computed only once).
+
+    With ``early_stop``, the test stops as soon as the p-value is clearly
+    (by about 3.3 standard errors) above or below ``alpha``, so that
+    obviously (in)significant results don't need every permutation.
+
+    :param l1: first integer vector (X)
+    :type l1: numpy.array or similar
+    :param l2: second integer vector (Y), which is shuffled
+    :type l2: numpy.array or similar
+    :param int n_permutations: maximum number of shuffles to draw
+    :param float alpha: significance threshold (used for early stopping)
+    :param int batch_size: number of shuffles per vectorized batch
+    :param seed: seed for :func:`numpy.random.default_rng`, for
+      reproducibility
+    :param bool early_stop: whether to stop once the outcome is clear
+    :returns: :class:`PermutationTest` of the observed mutual information,
+      its p-value, and the number of shuffles drawn
+    """
+    l1 = np.asarray(l1)
+    h = entropy(l1) + entropy(l2)
+
+    def statistic(shuffles):
+        return h - _batch_joint_entropy(l1, shuffles)
+
+    return _permutation_test(statistic, l2, n_permutations, alpha, batch_size,
+                             seed, early_stop)
+
+
+def synergy_permutation_test(g1, g2, c, n_permutations=1000, alpha=0.05,
+                             batch_size=100, seed=None, early_stop=True):
+    """
+    Test whether synergy is significant, by shuffling the phenotype.
+
+    See :func:`mutual_info_permutation_test`.  Only the three joint entropies
+    involving the phenotype change between shuffles, so those are the only
+    ones recounted for each batch.
+
+    :param g1: The first factor.
+    :param g2: The second factor.
+    :param c: The phenotype, which is shuffled.
+    :param int n_permutations: maximum number of shuffles to draw
+    :param float alpha: significance threshold (used for early stopping)
+    :param int batch_size: number of shuffles per vectorized batch
+    :param seed: seed for :func:`numpy.random.default_rng`, for
+      reproducibility
+    :param bool early_stop: whether to stop once the outcome is clear
+    :returns: :class:`PermutationTest` of the observed synergy, its p-value,
+      and the number of shuffles drawn
+    """
+    g1, g2 = np.asarray(g1), np.asarray(g2)
+    g12 = joint_dataset(g1, g2, compact=True)
+    h = entropy(g12) - entropy(g1) - entropy(g2) - entropy(c)
+
+    def statistic(shuffles):
+        return (h - _batch_joint_entropy(g12, shuffles) +
+                _batch_joint_entropy(g1, shuffles) +
+                _batch_joint_entropy(g2, shuffles))
+
+    return _permutation_test(statistic, c, n_permutations, alpha, batch_size,
+                             seed, early_stop)
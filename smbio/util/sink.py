@@ -0,0 +1,319 @@
+"""
+Result sinks, which stream results to disk instead of keeping them in memory.
+
+A sink is handed each result as it arrives (see the ``sink`` argument of
+:func:`smbio.experiment.Experiment.run`).  Results are buffered, and every
+``buffer_size`` results the buffer is written out, so memory use stays
+constant no matter how many results there are.  Afterwards, :func:`Sink.read`
+reads the output back one chunk at a time.
+
+A result becomes one row.  A dict maps column names to values; a tuple or
+list gives the values of each column in order; anything else is a row with a
+single column.
+"""
+
+import csv
+import os
+
+
+def _row(result):
+    """
+    Return a result as a row.
+
+    :param result: A result (dict, tuple, list, or a single value).
+    :return: The dict, or a list of column values.
+    """
+    if isinstance(result, dict):
+        return result
+    if isinstance(result, (tuple, list)):
+        return list(result)
+    return [result]
+
+
+class Sink(object):
+    """
+    Base class for result sinks.
+
+    Subclasses implement :func:`_write`, to write out a buffer of rows, and
+    :func:`read`.
+    """
+
+    def __init__(self, path, columns=None, buffer_size=10000):
+        """
+        **Constructor**
+
+        :param str path: Where to write the results.
+        :param list columns: Column names.  Default is the keys of the first
+          result if it is a dict, and otherwise the column numbers.
+        :param int buffer_size: Number of results held before they are
+          written out.
+        :return: None
+        """
+        self.path = path
+        self.columns = None if columns is None else list(columns)
+        self.buffer_size = buffer_size
+        self.rows = 0
+        self._buffer = []
+
+    def write(self, result):
+        """
+        Add a result, writing out the buffer if it is full.
+
+        :param result: The result (see the module docstring).
+        :return: None
+        """
+        row = _row(result)
+        if self.columns is None:
+            self.columns = (list(row) if isinstance(row, dict)
+                            else list(range(len(row))))
+        if isinstance(row, dict):
+            row = [row.get(column) for column in self.columns]
+        self._buffer.append(row)
+        self.rows += 1
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write out the buffered results.
+
+        :return: None
+        """
+        if self._buffer:
+            self._write(self._buffer)
+            self._buffer = []
+
+    def close(self):
+        """
+        Write out the buffered results and release any open files.
+
+        :return: None
+        """
+        self.flush()
+
+    def _write(self, rows):
+        """
+        Write out a buffer of rows.
+
+        :param list rows: Lists of column values.
+        :return: None
+        """
+        raise NotImplementedError('Sink._write')
+
+    def read(self):
+        """
+        Read the results back, one chunk at a time.
+
+        :return: Iterator of chunks.
+        """
+        raise NotImplementedError('Sink.read')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class CSVSink(Sink):
+    """
+    Appends results to a CSV file, with a header row.
+
+    If the file already exists, new results are appended to it (without a
+    second header).  Note that :func:`smbio.experiment.Experiment.run`
+    writes every result replayed from a journal to the sink, so a run that
+    resumes from a journal should be given a new file, not the one the run
+    that died was writing.
+    """
+
+    def __init__(self, path, columns=None, buffer_size=10000):
+        super().__init__(path, columns=columns, buffer_size=buffer_size)
+        self._file = None
+
+    def _write(self, rows):
+        if self._file is None:
+            header = not os.path.exists(self.path) or \
+                os.path.getsize(self.path) == 0
+            self._file = open(self.path, 'a', newline='')
+            self._writer = csv.writer(self._file)
+            if header:
+                self._writer.writerow(self.columns)
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def close(self):
+        super().close()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def read(self, chunksize=None):
+        """
+        Read the results back as DataFrames.
+
+        :param int chunksize: Rows per DataFrame.  Default is the buffer
+          size.
+        :return: Iterator of :class:`pandas.DataFrame`.
+        """
+        import pandas as pd
+        self.flush()
+        if self._file is not None:
+            self._file.flush()
+        return iter(pd.read_csv(self.path,
+                                chunksize=chunksize or self.buffer_size))
+
+
+class PartSink(Sink):
+    """
+    Writes each buffer of results to its own file, in a directory.
+
+    The parts are numbered in the order they were written.  If the directory
+    already holds parts, new ones are numbered after them.  Subclasses set
+    :attr:`extension` and implement :func:`_write_part` and
+    :func:`_read_part`.
+    """
+
+    extension = None
+
+    def parts(self):
+        """
+        Return the paths of the parts written so far, in order.
+
+        :return: List of paths.
+        """
+        if not os.path.isdir(self.path):
+            return []
+        return [os.path.join(self.path, name)
+                for name in sorted(os.listdir(self.path))
+                if name.startswith('part-') and name.endswith(self.extension)]
+
+    def _write(self, rows):
+        os.makedirs(self.path, exist_ok=True)
+        parts = self.parts()
+        index = int(os.path.basename(parts[-1])[5:-len(self.extension)]) + 1 \
+            if parts else 0
+        name = 'part-%06d%s' % (index, self.extension)
+        # Write to a temporary name, so that a reader never sees half a part.
+        tmp = os.path.join(self.path, '.' + name)
+        self._write_part(tmp, rows)
+        os.replace(tmp, os.path.join(self.path, name))
+
+    def _write_part(self, path, rows):
+        """
+        Write one part.
+
+        :param str path: File to write.
+        :param list rows: Lists of column values.
+        :return: None
+        """
+        raise NotImplementedError('PartSink._write_part')
+
+    def _read_part(self, path):
+        """
+        Read one part.
+
+        :param str path: File to read.
+        :return: The chunk.
+        """
+        raise NotImplementedError('PartSink._read_part')
+
+    def read(self):
+        """
+        Read the results back, one part at a time.
+
+        :return: Iterator of chunks, one per part.
+        """
+        self.flush()
+        for path in self.parts():
+            yield self._read_part(path)
+
+    def _frame(self, rows):
+        """Return rows as a DataFrame with string column names."""
+        import pandas as pd
+        return pd.DataFrame(rows, columns=[str(c) for c in self.columns])
+
+
+class NPYSink(PartSink):
+    """
+    Writes results to a directory of ``.npy`` files.
+
+    Every result must have the same number of numeric columns.  Each part is
+    a 2-D array with one row per result, and :func:`read` memory-maps them,
+    so reading back is lazy too.
+    """
+
+    extension = '.npy'
+
+    def __init__(self, path, columns=None, buffer_size=10000, dtype=None):
+        """
+        **Constructor**
+
+        :param str path: Directory to write the parts to.
+        :param list columns: Column names (only used to order dict results).
+        :param int buffer_size: Number of results per part.
+        :param dtype: NumPy dtype of the arrays.  Default is inferred from
+          each buffer.
+        :return: None
+        """
+        super().__init__(path, columns=columns, buffer_size=buffer_size)
+        self.dtype = dtype
+
+    def _write_part(self, path, rows):
+        import numpy as np
+        with open(path, 'wb') as f:
+            np.save(f, np.asarray(rows, dtype=self.dtype))
+
+    def _read_part(self, path):
+        import numpy as np
+        return np.load(path, mmap_mode='r')
+
+
+class ParquetSink(PartSink):
+    """
+    Writes results to a directory of Parquet files.
+
+    Requires pandas, and pyarrow or fastparquet.  :func:`read` yields
+    DataFrames; the directory can also be read in one go with
+    :func:`pandas.read_parquet`.
+    """
+
+    extension = '.parquet'
+
+    def __init__(self, path, columns=None, buffer_size=10000):
+        # Fail now, rather than in the middle of a run.
+        import pandas
+        try:
+            import pyarrow
+        except ImportError:
+            import fastparquet
+        super().__init__(path, columns=columns, buffer_size=buffer_size)
+
+    def _write_part(self, path, rows):
+        self._frame(rows).to_parquet(path, index=False)
+
+    def _read_part(self, path):
+        import pandas as pd
+        return pd.read_parquet(path)
+
+
+class FeatherSink(PartSink):
+    """
+    Writes results to a directory of Feather files.
+
+    Requires pandas and pyarrow.  :func:`read` yields DataFrames.
+    """
+
+    extension = '.feather'
+
+    def __init__(self, path, columns=None, buffer_size=10000):
+        # Fail now, rather than in the middle of a run.
+        import pandas
+        import pyarrow
+        super().__init__(path, columns=columns, buffer_size=buffer_size)
+
+    def _write_part(self, path, rows):
+        self._frame(rows).to_feather(path)
+
+    def _read_part(self, path):
+        import pandas as pd
+        return pd.read_feather(path)